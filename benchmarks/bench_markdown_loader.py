@@ -0,0 +1,84 @@
+import argparse
+import random
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+import tiktoken
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generate_questions import MarkdownScraper  # noqa: E402
+from text_chunker import count_tokens  # noqa: E402
+
+WORDS = (
+    "process thread memory page table cache latency throughput scheduler kernel interrupt register "
+    "pipeline branch vector matrix gradient network packet protocol socket buffer index query"
+).split()
+
+
+def synthetic_notes(size_bytes: int, seed: int = 0) -> str:
+    """Builds Markdown notes with headings, paragraphs, bullet lists and code blocks."""
+    rng = random.Random(seed)
+    parts, written, section = [], 0, 1
+    while written < size_bytes:
+        block = [f"## Section {section}\n\n"]
+        for _ in range(rng.randint(1, 4)):
+            sentences = (
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 20))).capitalize() + "."
+                for _ in range(rng.randint(2, 6))
+            )
+            block.append(" ".join(sentences) + "\n\n")
+        block.extend(f"- {rng.choice(WORDS)}: {' '.join(rng.sample(WORDS, 6))}\n" for _ in range(rng.randint(0, 5)))
+        block.append("\n```python\nresult = [x for x in range(10)]\n```\n\n" if rng.random() < 0.2 else "\n")
+        text = "".join(block)
+        parts.append(text)
+        written += len(text)
+        section += 1
+    return "".join(parts)
+
+
+def previous_scrape(markdown_path: str, max_tokens: int = 16000) -> str:
+    """The previous MarkdownScraper.scrape: a fresh encoder per call, string concatenation, truncation."""
+    enc = tiktoken.get_encoding("cl100k_base")
+    text, token_total = "", 0
+    with open(markdown_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            tokens = enc.encode(line)
+            token_total += len(tokens)
+            if token_total > max_tokens:
+                break
+            text += line
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the Markdown window loader on multi-megabyte notes.")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--max-tokens", type=int, default=16000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size_mb in args.sizes_mb:
+            path = Path(directory) / f"notes_{size_mb}mb.md"
+            path.write_text(synthetic_notes(int(size_mb * 1e6)), encoding="utf-8")
+            total_tokens = count_tokens(path.read_text(encoding="utf-8"))
+
+            start = perf_counter()
+            windows = list(MarkdownScraper.windows(str(path), args.max_tokens))
+            elapsed = perf_counter() - start
+            covered = sum(count_tokens(window) for window in windows)
+            print(
+                f"{size_mb:>6.1f} MB, {total_tokens} tokens: {len(windows)} windows, "
+                f"{covered / total_tokens:.0%} covered, {elapsed:.3f}s ({size_mb / elapsed:.1f} MB/s)"
+            )
+
+            start = perf_counter()
+            prefix = previous_scrape(str(path), args.max_tokens)
+            elapsed = perf_counter() - start
+            print(f"{'':>6} previous scrape: {count_tokens(prefix) / total_tokens:.1%} covered, {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
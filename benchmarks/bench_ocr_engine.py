@@ -0,0 +1,50 @@
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ocr_engine  # noqa: E402
+from pdf_pages import page_count  # noqa: E402
+from pdf2image import convert_from_path  # noqa: E402
+
+
+def time_backend(name, ocr_func, images, workers):
+    """Recognizes every image with the given function and prints the pages-per-second rate."""
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(ocr_func, images))
+    elapsed = perf_counter() - start
+    print(f"{name:<12} {len(images)} pages in {elapsed:.2f}s ({len(images) / elapsed:.2f} pages/s)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pytesseract subprocess OCR with the recognizer pool.")
+    parser.add_argument("pdf", type=Path)
+    parser.add_argument("--pages", type=int, default=20, help="Number of pages to OCR from the start of the PDF")
+    parser.add_argument("--workers", type=int, default=cpu_count())
+    parser.add_argument("--dpi", type=int, default=200)
+    args = parser.parse_args()
+
+    last_page = min(args.pages, page_count(args.pdf))
+    images = convert_from_path(args.pdf, dpi=args.dpi, first_page=1, last_page=last_page)
+    print(f"Rendered {len(images)} pages at {args.dpi} DPI, {args.workers} workers")
+
+    subprocess_time = time_backend("pytesseract", ocr_engine.pytesseract_ocr, images, args.workers)
+    if ocr_engine.tesserocr_module() is None:
+        print("tesserocr is not installed; skipping the recognizer pool.")
+        return
+
+    pool = ocr_engine.get_pool("eng", size=args.workers)
+    # Loads the language model into every recognizer so the timed run measures steady state
+    time_backend("pool warmup", pool.ocr_image, images[: args.workers], args.workers)
+    pool_time = time_backend("pool", pool.ocr_image, images, args.workers)
+    print(f"Speed-up: {subprocess_time / pool_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
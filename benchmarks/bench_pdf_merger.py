@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pdf_merger import merge_pdfs_incremental  # noqa: E402
+
+SUBJECT = "BENCH101"
+
+
+def make_pdfs(folder: Path, count: int, pages: int, start: int = 1, image_size: int = 200) -> None:
+    """Writes lecture-like PDFs with text pages, a slide image and a small bookmark tree each."""
+    import pymupdf
+
+    for number in range(start, start + count):
+        document = pymupdf.open()
+        # Random pixels do not compress, so every input carries about image_size**2 * 3 bytes of its own
+        image = pymupdf.Pixmap(pymupdf.csRGB, image_size, image_size, os.urandom(image_size * image_size * 3), False)
+        for page_number in range(pages):
+            page = document.new_page()
+            if page_number == 0:
+                page.insert_image(pymupdf.Rect(72, 400, 540, 760), pixmap=image)
+            page.insert_text((72, 72), f"Lecture {number}, page {page_number + 1}", fontsize=18)
+            page.insert_textbox(pymupdf.Rect(72, 100, 540, 760), "lorem ipsum dolor sit amet " * 120, fontsize=9)
+        document.set_toc([[1, f"Lecture {number}", 1], [2, "Summary", pages]])
+        document.save(folder / f"{SUBJECT}-lecture{number}.pdf")
+        document.close()
+
+
+def previous_merge(folder: Path, output: Path) -> None:
+    """The previous merge: every input appended to one in-memory merger, written once at the end.
+
+    pypdf's PdfWriter is the maintained successor of the PyPDF2 PdfMerger that merge_pdfs uses.
+    """
+    from natsort import natsorted
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for file in natsorted(folder.glob(f"{SUBJECT}*.pdf"), key=lambda file: file.name):
+        writer.append(file)
+    writer.write(output)
+    writer.close()
+
+
+def run_scenario(scenario: str, folder: Path, output: Path) -> None:
+    """Runs one scenario in this process and prints its wall time and peak memory as JSON."""
+    start = perf_counter()
+    if scenario == "previous":
+        previous_merge(folder, output)
+    else:
+        merge_pdfs_incremental(str(folder), str(output), SUBJECT)
+    elapsed = perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"seconds": elapsed, "peak_mb": peak_mb}))
+
+
+def measure(scenario: str, folder: Path, output: Path) -> dict:
+    """Runs a scenario in a fresh interpreter so peak memory is not shared between scenarios."""
+    result = subprocess.run(
+        [sys.executable, __file__, "--scenario", scenario, "--folder", str(folder), "--output", str(output)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure incremental PDF merging on hundreds of inputs.")
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--pages", type=int, default=10, help="Pages per input PDF")
+    parser.add_argument("--image-size", type=int, default=200, help="Side in pixels of each input's slide image")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--folder", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--output", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        run_scenario(args.scenario, args.folder, args.output)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        folder = Path(directory) / "inputs"
+        folder.mkdir()
+        make_pdfs(folder, args.files, args.pages, image_size=args.image_size)
+        total_mb = sum(file.stat().st_size for file in folder.iterdir()) / 1e6
+        print(f"{args.files} PDFs, {args.files * args.pages} pages, {total_mb:.1f} MB of input")
+
+        rows = []
+        try:
+            rows.append(("previous one-shot merge", measure("previous", folder, Path(directory) / "previous.pdf")))
+        except subprocess.CalledProcessError as error:
+            print(f"previous merge skipped: {error.stderr.strip().splitlines()[-1]}")
+
+        output = Path(directory) / "merged.pdf"
+        rows.append(("incremental, first build", measure("incremental", folder, output)))
+        rows.append(("incremental, nothing changed", measure("incremental", folder, output)))
+        make_pdfs(folder, 1, args.pages, start=args.files + 1, image_size=args.image_size)
+        rows.append(("incremental, one file added", measure("incremental", folder, output)))
+
+        for name, row in rows:
+            print(f"{name:<30} {row['seconds'] * 1000:>9.0f} ms {row['peak_mb']:>8.0f} MB peak")
+
+
+if __name__ == "__main__":
+    main()
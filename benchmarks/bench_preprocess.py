@@ -0,0 +1,65 @@
+import argparse
+import sys
+from difflib import SequenceMatcher
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ocr_engine  # noqa: E402
+from image_preprocess import iter_preprocessed_pages  # noqa: E402
+from pdf_pages import iter_page_images, page_count  # noqa: E402
+
+
+def words(text: str) -> list[str]:
+    """Normalizes OCR output to a list of lowercase words for comparison."""
+    return text.lower().split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OCR on raw renders with the preprocessing stage.")
+    parser.add_argument("pdf", type=Path)
+    parser.add_argument("--pages", type=int, default=20, help="Number of pages to OCR from the start of the PDF")
+    parser.add_argument("--dpi", type=int, default=300, help="Fixed DPI of the baseline render")
+    parser.add_argument("--window-size", type=int, default=4, help="Pages rendered per pdftoppm call on both sides")
+    args = parser.parse_args()
+
+    pages = range(1, min(args.pages, page_count(args.pdf)) + 1)
+
+    # Baseline: fixed DPI, full colour pages rendered in windows as stream_ocr does, straight into Tesseract
+    start = perf_counter()
+    baseline, baseline_pixels = {}, 0
+    for page_number, image in iter_page_images(args.pdf, pages, args.window_size, dpi=args.dpi):
+        baseline_pixels += image.width * image.height
+        baseline[page_number] = ocr_engine.recognize(image)
+    baseline_time = perf_counter() - start
+
+    # Preprocessed: adaptive DPI, binarized, cropped, blank pages skipped
+    start = perf_counter()
+    processed, processed_pixels, blank_pages = {}, 0, 0
+    for page_number, image in iter_preprocessed_pages(args.pdf, pages, window_size=args.window_size):
+        if image is None:
+            blank_pages += 1
+            processed[page_number] = ""
+            continue
+        processed_pixels += image.width * image.height
+        processed[page_number] = ocr_engine.recognize(image)
+    processed_time = perf_counter() - start
+
+    similarity = SequenceMatcher(
+        None,
+        words("\n".join(baseline[page] for page in pages)),
+        words("\n".join(processed[page] for page in pages)),
+        autojunk=False,
+    ).ratio()
+
+    count = len(pages)
+    print(f"baseline     {count} pages in {baseline_time:.2f}s ({count / baseline_time:.2f} pages/s), "
+          f"{baseline_pixels / 1e6:.0f} MP")
+    print(f"preprocessed {count} pages in {processed_time:.2f}s ({count / processed_time:.2f} pages/s), "
+          f"{processed_pixels / 1e6:.0f} MP, {blank_pages} blank pages skipped")
+    print(f"Speed-up: {baseline_time / processed_time:.2f}x, word-level agreement with baseline: {similarity:.1%}")
+
+
+if __name__ == "__main__":
+    main()
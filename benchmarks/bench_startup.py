@@ -0,0 +1,96 @@
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Scripts that are started from the command line; importing one must not prompt or do work
+ENTRY_POINTS = [
+    "generate_questions",
+    "pdf_to_text_openai",
+    "pdf_to_text_llama",
+    "text_scraper",
+    "textbook_summary",
+]
+
+
+def import_wall_time(module: str) -> float:
+    """Returns the wall time in seconds of a fresh interpreter that imports the module and exits."""
+    # The interpreter reports its own clock so process creation noise stays out of the figure
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, stdin=subprocess.DEVNULL, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def interpreter_wall_time() -> float:
+    """Returns the wall time in seconds of starting and stopping a bare interpreter."""
+    start = perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], cwd=ROOT, check=True)
+    return perf_counter() - start
+
+
+def import_costs(module: str) -> list[tuple[str, int]]:
+    """Returns (package, cumulative microseconds) for the top-level packages the module pulls in."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    costs: dict[str, int] = {}
+    children: list[tuple[str, int]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # importtime indents nested imports by two spaces per level and lists them before their parent
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name.strip().split(".")[0], int(cumulative)))
+        elif depth == 0:
+            if name.strip() == module:
+                for package, microseconds in children:
+                    costs[package] = costs.get(package, 0) + microseconds
+            children = []
+    return sorted(costs.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of every entry-point script.")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per script, the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="Most expensive imports listed per script")
+    parser.add_argument("--budget-ms", type=float, help="Exit with an error if any script imports slower than this")
+    args = parser.parse_args()
+
+    print(f"bare interpreter start: {interpreter_wall_time() * 1000:.0f} ms")
+    over_budget = []
+    for module in args.modules:
+        try:
+            median = statistics.median(import_wall_time(module) for _ in range(args.runs)) * 1000
+            costs = import_costs(module)
+        except subprocess.CalledProcessError as error:
+            print(f"{module}: import failed\n{error.stderr.strip()}")
+            over_budget.append(module)
+            continue
+
+        print(f"{module}: {median:.0f} ms")
+        for package, cumulative in costs[:args.top]:
+            print(f"    {package:<24} {cumulative / 1000:>7.1f} ms")
+        if args.budget_ms is not None and median > args.budget_ms:
+            over_budget.append(module)
+
+    if over_budget:
+        print(f"Over budget or failing: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import random
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from text_chunker import chunk_text, count_tokens  # noqa: E402
+
+WORDS = (
+    "process thread memory page table cache latency throughput scheduler kernel interrupt register "
+    "pipeline branch vector matrix gradient network packet protocol socket buffer index query"
+).split()
+
+
+def synthetic_ocr_text(word_count: int, seed: int = 0) -> str:
+    """Builds OCR-like text with headings, paragraphs and sentences of random words."""
+    rng = random.Random(seed)
+    parts, written, section = [], 0, 1
+    while written < word_count:
+        parts.append(f"# Section {section}\n\n")
+        for _ in range(rng.randint(2, 6)):
+            sentences = []
+            for _ in range(rng.randint(2, 8)):
+                length = rng.randint(5, 20)
+                sentences.append(" ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + ".")
+                written += length
+            parts.append(" ".join(sentences) + "\n\n")
+        section += 1
+    return "".join(parts)
+
+
+def naive_chunk_text(text: str, max_words: int) -> list[str]:
+    """The previous PDFProcessor.chunk_text, which rebuilds the chunk string for every word."""
+    words = text.split()
+    chunks = []
+    current_chunk = []
+
+    for word in words:
+        if len(" ".join(current_chunk + [word])) <= max_words:
+            current_chunk.append(word)
+        else:
+            chunks.append(" ".join(current_chunk))
+            current_chunk = [word]
+
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure text_chunker throughput on synthetic OCR output.")
+    parser.add_argument("--words", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-tokens", type=int, default=3000)
+    parser.add_argument("--overlap", type=int, default=200)
+    parser.add_argument("--naive", action="store_true", help="Also time the previous quadratic chunker")
+    args = parser.parse_args()
+
+    for word_count in args.words:
+        text = synthetic_ocr_text(word_count)
+        size_mb = len(text.encode("utf-8")) / 1e6
+
+        start = perf_counter()
+        chunks = chunk_text(text, args.max_tokens, args.overlap)
+        elapsed = perf_counter() - start
+        largest = max(count_tokens(chunk) for chunk in chunks)
+        print(
+            f"{word_count:>9} words ({size_mb:.1f} MB): {len(chunks)} chunks, largest {largest} tokens, "
+            f"{elapsed:.3f}s ({size_mb / elapsed:.1f} MB/s)"
+        )
+
+        if args.naive:
+            # The old chunker budgets characters, so give it a comparable character limit
+            start = perf_counter()
+            naive_chunk_text(text, args.max_tokens * 4)
+            print(f"{'':>9} previous chunk_text: {perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,254 @@
+import argparse
+import hashlib
 import json
+import re
+from pathlib import Path
+from typing import Iterator
 
-# Load data from JSON file
-user_input = input("Enter a file name: ")
-with open(f'database/{user_input}.json', 'r') as f:
-    data = json.load(f)
-
-# Find duplicates
-app_counts = {}
-duplicate_apps = []
-
-for app in data['apps']:
-    if app in app_counts:
-        if app_counts[app] == 1:
-            duplicate_apps.append(app)
-        app_counts[app] += 1
-    else:
-        app_counts[app] = 1
-
-# Print duplicates
-if duplicate_apps:
-    print("Duplicate apps:")
-    for app in duplicate_apps:
-        print(app)
-else:
-    print("No duplicate apps found.")
+# ijson parses with a C backend when available; without it the stdlib decoder is fed one chunk at a time
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+DATABASE_DIRECTORY = Path("database")
+CHUNK_SIZE = 1 << 20  # Bytes read from the file at a time
+
+# Trailing dotted or "v" versions and architecture tags, e.g. "Python 3.11.4 (64-bit)" or "7-Zip 23.01 (x64)";
+# a bare number is kept since it is often part of the name, as in "Windows 10"
+VERSION_SUFFIX_PATTERN = re.compile(
+    r"(?:[\s\-_]+(?:v(?:ersion)?\s*\d+(?:\.\d+)*|\d+(?:\.\d+)+)\w*"
+    r"|[\s\-_]*\((?:x64|x86|arm64|\d+-bit)\)|[\s\-_]+(?:x64|x86|arm64|\d+-bit))+$",
+    re.IGNORECASE,
+)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+_decoder = json.JSONDecoder()
+# Characters that may follow a complete number; anything else means the number goes on in the next chunk
+NUMBER_DELIMITERS = frozenset(",]} \t\r\n")
+
+
+def normalize_app_name(name: str) -> str:
+    """Folds case and whitespace and strips version and architecture suffixes."""
+    name = WHITESPACE_PATTERN.sub(" ", name).strip()
+    return VERSION_SUFFIX_PATTERN.sub("", name).casefold() or name.casefold()
+
+
+def _iter_stdlib(path: Path, key: str, chunk_size: int) -> Iterator:
+    """Yields the items of the top-level ``key`` array with the stdlib decoder, one file chunk at a time."""
+    with open(path, "r", encoding="utf-8") as file:
+        buffer, position, at_end = "", 0, False
+
+        def fill() -> bool:
+            # Drops what has been consumed and appends the next chunk; returns False at end of file
+            nonlocal buffer, position, at_end
+            chunk = file.read(chunk_size)
+            buffer, position = buffer[position:] + chunk, 0
+            at_end = not chunk
+            return bool(chunk)
+
+        def skip() -> None:
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer) or not fill():
+                    return
+
+        def expect(character: str) -> None:
+            skip()
+            if position >= len(buffer) or buffer[position] != character:
+                raise ValueError(f"{path}: expected '{character}' at character {position}")
+
+        def at(character: str) -> bool:
+            skip()
+            return position < len(buffer) and buffer[position] == character
+
+        def decode():
+            # Values split across chunks fail to decode until the rest of them has been read
+            nonlocal position
+            while True:
+                try:
+                    value, end = _decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if not fill():
+                        raise
+                    continue
+                # A number is only complete once a delimiter follows it, e.g. "1." then "5e10" must not decode as 1
+                if (isinstance(value, (int, float)) and not isinstance(value, bool) and not at_end
+                        and (end == len(buffer) or buffer[end] not in NUMBER_DELIMITERS) and fill()):
+                    continue
+                position = end
+                return value
+
+        def next_item(closing: str) -> bool:
+            # After an item comes either the closing bracket or exactly one comma and another item, as json.load expects
+            nonlocal position
+            if at(closing):
+                return False
+            if position >= len(buffer):
+                what = f"'{key}' array" if closing == "]" else "object"
+                raise ValueError(f"{path}: unterminated {what}")
+            expect(",")
+            position += 1
+            skip()
+            if position >= len(buffer) or buffer[position] in ",]}":
+                raise ValueError(f"{path}: expected a value at character {position}")
+            return True
+
+        fill()
+        expect("{")
+        position += 1
+        if at("}"):
+            return
+        while True:
+            name = decode()
+            if not isinstance(name, str):
+                raise ValueError(f"{path}: object keys must be strings, got {name!r}")
+            expect(":")
+            position += 1
+            skip()
+            if name != key:
+                decode()
+                if not next_item("}"):
+                    return
+                continue
+
+            expect("[")
+            position += 1
+            if at("]"):
+                return
+            while True:
+                yield decode()
+                if not next_item("]"):
+                    return
+
+
+def iter_json_array(path: Path, key: str = "apps", chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """Yields the items of a top-level array without loading the whole document."""
+    if ijson is not None:
+        with open(path, "rb") as file:
+            yield from ijson.items(file, f"{key}.item")
+        return
+    yield from _iter_stdlib(path, key, chunk_size)
+
+
+def app_name(app) -> str:
+    """Returns the name of an app entry, which is normally a plain string."""
+    if isinstance(app, dict):
+        return str(app.get("name", json.dumps(app, sort_keys=True)))
+    return str(app)
+
+
+class DuplicateCounter:
+    """Counts app names across files in memory proportional to the number of distinct names.
+
+    Names are counted by an 8-byte digest rather than by the string itself, and the readable name is only
+    kept once a name turns out to be a duplicate. Which files a name appears in is a bit mask.
+    """
+
+    def __init__(self, normalize: bool = False) -> None:
+        """Initializes empty counts; with ``normalize`` set, names are compared after normalize_app_name."""
+        self.normalize = normalize
+        self.files: list[Path] = []
+        self.counts: list[dict[bytes, int]] = []
+        self.file_masks: dict[bytes, int] = {}
+        self.names: dict[bytes, set[str]] = {}
+
+    def add_file(self, path: Path, key: str = "apps") -> int:
+        """Counts every app in a file and returns how many entries it had.
+
+        If the file cannot be read or parsed, its partial counts are discarded before the error is raised.
+        """
+        index = len(self.files)
+        bit = 1 << index
+        counts: dict[bytes, int] = {}
+        try:
+            for app in iter_json_array(path, key):
+                name = app_name(app)
+                compared = normalize_app_name(name) if self.normalize else name
+                digest = hashlib.blake2b(compared.encode("utf-8"), digest_size=8).digest()
+                count = counts.get(digest, 0) + 1
+                counts[digest] = count
+                mask = self.file_masks.get(digest, 0)
+                if count > 1 or mask & ~bit:
+                    # Second sighting in this file or another one: remember the spelling for the report
+                    self.names.setdefault(digest, set()).add(name)
+                self.file_masks[digest] = mask | bit
+        except Exception:
+            for digest in counts:
+                mask = self.file_masks[digest] & ~bit
+                if mask:
+                    self.file_masks[digest] = mask
+                else:
+                    del self.file_masks[digest]
+                    self.names.pop(digest, None)
+            raise
+
+        self.files.append(path)
+        self.counts.append(counts)
+        return sum(counts.values())
+
+    def duplicates_in(self, index: int) -> list[tuple[str, int]]:
+        """Returns (names, count) for every name that occurs more than once in one file."""
+        return sorted(
+            (" / ".join(sorted(self.names.get(digest, {"?"}))), count)
+            for digest, count in self.counts[index].items()
+            if count > 1
+        )
+
+    def cross_file_duplicates(self) -> list[tuple[str, list[Path]]]:
+        """Returns (names, files) for every name found in more than one file."""
+        duplicates = []
+        for digest, mask in self.file_masks.items():
+            if mask & (mask - 1):
+                files = [path for index, path in enumerate(self.files) if mask >> index & 1]
+                duplicates.append((" / ".join(sorted(self.names.get(digest, {"?"}))), files))
+        return sorted(duplicates)
+
+
+def resolve(name: str) -> Path:
+    """Accepts a path or a bare name under the database directory, as the prompt always has."""
+    path = Path(name)
+    if path.suffix == ".json" and path.exists():
+        return path
+    return DATABASE_DIRECTORY / f"{name}.json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find duplicate apps in one or more app-list JSON files.")
+    parser.add_argument("files", nargs="*", help="File names under database/ (without .json) or paths")
+    parser.add_argument("--normalize", action="store_true", help="Ignore case, spacing and version suffixes")
+    parser.add_argument("--key", default="apps", help="Top-level array holding the app names")
+    args = parser.parse_args()
+
+    names = args.files or input("Enter a file name: ").replace(",", " ").split()
+    counter = DuplicateCounter(normalize=args.normalize)
+    for name in names:
+        path = resolve(name)
+        try:
+            total = counter.add_file(path, args.key)
+        except (FileNotFoundError, ValueError, json.JSONDecodeError) as error:
+            print(f"Could not read {path}: {error}")
+            continue
+        print(f"{path}: {total} apps")
+
+    for index, path in enumerate(counter.files):
+        duplicates = counter.duplicates_in(index)
+        # Print duplicates
+        if duplicates:
+            print(f"Duplicate apps in {path}:")
+            for app, count in duplicates:
+                print(f"{app} (x{count})")
+        else:
+            print(f"No duplicate apps found in {path}.")
+
+    if len(counter.files) > 1:
+        duplicates = counter.cross_file_duplicates()
+        print(f"{len(duplicates)} apps appear in more than one file:")
+        for app, files in duplicates:
+            print(f"{app}: {', '.join(str(path) for path in files)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,185 @@
+import argparse
+import json
 import os
-import glob
+from collections import deque
+from itertools import count
 from natsort import natsorted
 from re import sub
 
+# Both start with "__", which the planner skips, so a rerun never plans to rename them
+JOURNAL_NAME = "__rename_journal"
+TEMPORARY_PREFIX = "__rename_tmp_"
+
 
 def remove_existing_numbers(filename):
     """Remove any leading numbers and spaces from the filename."""
     return sub(r'^\d+\s*.', '', filename)
 
 
-# Define the directory containing the files
-user_input = input("Enter a file path: ")
-directory = user_input
+def plan_renames(directory):
+    """Returns {old name: new name} for every file in the directory, from a single scandir pass."""
+    # Hidden entries are left out as glob('*') always did; is_dir() is answered from the directory listing
+    with os.scandir(directory) as entries:
+        names = [(entry.name, entry.is_dir()) for entry in entries if not entry.name.startswith('.')]
+
+    plan = {}
+    for i, (name, is_dir) in enumerate(natsorted(names, key=lambda item: item[0])):
+        # Check if file is directory
+        if is_dir or name.startswith('__'):
+            continue
+
+        # Extract the file name and file extension
+        file_name, file_extension = os.path.splitext(name)
+
+        file_name = remove_existing_numbers(file_name)
+        # Create the new file name with zero-padded numbering and the original name
+        new_name = f'{i:02}.{file_name}{file_extension}'
+        if new_name != name:
+            plan[name] = new_name
+
+    # A new name may only be taken by a file that is itself being renamed away
+    conflicts = sorted(set(plan.values()) & ({name for name, _ in names} - plan.keys()))
+    if conflicts:
+        raise FileExistsError(f"Renaming would overwrite: {', '.join(conflicts)}")
+    return plan
+
+
+def order_renames(plan):
+    """Orders renames so none lands on a file not yet moved, parking one file of each cycle under a temporary name."""
+    temporary_names = (f"{TEMPORARY_PREFIX}{os.getpid()}_{n}" for n in count())
+    pending = dict(plan)
+    # The rename waiting for a name to be freed, keyed by that name
+    waiting = {new: old for old, new in pending.items() if new in pending}
+    ready = deque(old for old, new in pending.items() if new not in pending)
+    steps = []
+    while pending:
+        if not ready:
+            # Everything left is in cycles such as a -> b -> a; parking one file breaks its cycle
+            old = next(iter(pending))
+            temporary = next(temporary_names)
+            steps.append((old, temporary))
+            new = pending.pop(old)
+            pending[temporary] = new
+            waiting[new] = temporary
+            ready.append(waiting.pop(old))
+            continue
+
+        old = ready.popleft()
+        steps.append((old, pending.pop(old)))
+        if old in waiting:
+            ready.append(waiting.pop(old))
+    return steps
+
+
+def read_journal(directory):
+    """Returns the journaled steps with how many were done and how many undone, or None without a journal."""
+    try:
+        with open(os.path.join(directory, JOURNAL_NAME), 'r', encoding='utf-8') as journal:
+            steps = json.loads(journal.readline())["steps"]
+            marks = journal.read()
+    except FileNotFoundError:
+        return None
+    return steps, marks.count("+"), marks.count("-")
+
+
+def apply_steps(directory, steps, journal, mark):
+    """Renames each (old, new) step in order and writes mark to the journal after each one.
+
+    A crash between a rename and its journal mark can only leave the first step done but unmarked,
+    so that is the one step recognised as done from the directory itself rather than from the journal.
+    """
+    for position, (old, new) in enumerate(steps):
+        old_path, new_path = (os.path.join(directory, name) for name in (old, new))
+        if os.path.lexists(old_path) and not os.path.lexists(new_path):
+            os.rename(old_path, new_path)
+        elif position or os.path.lexists(old_path) or not os.path.lexists(new_path):
+            raise FileExistsError(f"Cannot rename {old_path} to {new_path}; the directory changed after planning")
+        journal.write(mark)
+        journal.flush()
+
+
+def rename_files(directory, dry_run=False):
+    """Plans every rename up front, then carries it out with a journal that resume() and rollback() read.
+
+    The journal is kept once every rename is done, so the last batch can still be rolled back.
+    """
+    journaled = read_journal(directory)
+    if journaled is not None and (journaled[1] < len(journaled[0]) or journaled[2]):
+        raise RuntimeError(f"An unfinished rename is journaled in {directory}; use --resume or --rollback")
+
+    steps = order_renames(plan_renames(directory))
+    for old, new in steps:
+        if not new.startswith(TEMPORARY_PREFIX):
+            print(f"{old} -> {new}" if dry_run else os.path.join(directory, new))
+    if dry_run or not steps:
+        return steps
+
+    journal_path = os.path.join(directory, JOURNAL_NAME)
+    with open(journal_path, 'w', encoding='utf-8') as journal:
+        journal.write(json.dumps({"steps": steps}) + "\n")
+        journal.flush()
+        # The plan must be on disk before the first rename, or a crash could leave renames nothing can undo
+        os.fsync(journal.fileno())
+        apply_steps(directory, steps, journal, "+")
+    return steps
+
 
-# Get a list of all files in the directory
-files = natsorted(glob.glob(os.path.join(directory, '*')))
+def resume(directory):
+    """Finishes a journaled rename that was interrupted."""
+    journaled = read_journal(directory)
+    if journaled is None:
+        print("Nothing to resume.")
+        return
+    steps, done, undone = journaled
+    if undone:
+        raise RuntimeError("A rollback was interrupted; run --rollback again to finish it")
+    if done == len(steps):
+        print("Nothing to resume.")
+        return
+    with open(os.path.join(directory, JOURNAL_NAME), 'a', encoding='utf-8') as journal:
+        apply_steps(directory, steps[done:], journal, "+")
+    print(f"Resumed after {done} of {len(steps)} renames.")
 
-# Loop through the files and rename them
-for i, file_path in enumerate(files):
-    # Check if file is directory
-    if os.path.isdir(file_path) or os.path.basename(file_path).startswith('__'):
-        continue
 
-    # Extract the file name and file extension
-    file_name, file_extension = os.path.splitext(os.path.basename(file_path))
+def rollback(directory):
+    """Undoes the last journaled rename, finished or not, restoring every original name."""
+    journaled = read_journal(directory)
+    if journaled is None:
+        print("Nothing to roll back.")
+        return
+    steps, done, undone = journaled
+    with open(os.path.join(directory, JOURNAL_NAME), 'a', encoding='utf-8') as journal:
+        if not undone and done < len(steps):
+            # The step after the last one marked done may have happened just before the crash
+            old, new = (os.path.join(directory, name) for name in steps[done])
+            if not os.path.lexists(old) and os.path.lexists(new):
+                journal.write("+")
+                journal.flush()
+                done += 1
+        undo = [(new, old) for old, new in reversed(steps[:done])]
+        apply_steps(directory, undo[undone:], journal, "-")
+    os.remove(os.path.join(directory, JOURNAL_NAME))
+    print(f"Rolled back {done} renames.")
 
-    file_name = remove_existing_numbers(file_name)
-    # Create the new file name with zero-padded numbering and the original name
-    new_file_name = f'{i:02}.{file_name}{file_extension}'
 
-    # Create the new file path
-    new_file_path = os.path.join(directory, new_file_name)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Number the files in a directory in natural sort order.")
+    parser.add_argument("directory", nargs="?", help="Directory containing the files")
+    parser.add_argument("--dry-run", action="store_true", help="Print the renames without doing them")
+    parser.add_argument("--resume", action="store_true", help="Finish an interrupted rename")
+    parser.add_argument("--rollback", action="store_true", help="Undo the last journaled rename")
+    args = parser.parse_args()
 
-    print(new_file_path)
-    # Rename the file
-    os.rename(file_path, new_file_path)
+    # Define the directory containing the files
+    directory = args.directory or input("Enter a file path: ")
 
-print("Files have been renamed.")
+    try:
+        if args.resume:
+            resume(directory)
+        elif args.rollback:
+            rollback(directory)
+        else:
+            rename_files(directory, args.dry_run)
+            print("Planned renames listed." if args.dry_run else "Files have been renamed.")
+    except (OSError, RuntimeError) as error:
+        print(f"Error: {error}")
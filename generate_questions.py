@@ -1,9 +1,15 @@
-from csv import QUOTE_MINIMAL
-import pandas as pd
+import csv
+import asyncio
 import logging
-from os import getenv, path
-import openai
-import tiktoken
+import re
+from contextlib import contextmanager
+from math import ceil
+from os import getenv, linesep, path
+from typing import AsyncIterator, Callable, Iterator
+
+from llm_cache import get_cache as get_llm_cache
+from llm_client import OpenAIClient, StreamStats
+from text_chunker import chunk_stream, count_tokens
 
 
 class Logger:
@@ -12,72 +18,258 @@ class Logger:
         logging.basicConfig(level=logging.INFO, filename=log_file, filemode='a',
                             format='%(asctime)s - %(levelname)s - %(message)s')
         logging.getLogger('openai').setLevel(logging.WARNING)
+        logging.getLogger('httpx').setLevel(logging.WARNING)
 
 
 class MarkdownScraper:
     @staticmethod
-    def scrape(markdown_path: str, max_tokens: int = 16000) -> str:
-        enc = tiktoken.get_encoding("cl100k_base")
-        text, token_total = "", 0
+    def iter_paragraphs(markdown_path: str) -> Iterator[str]:
+        # Reads the file lazily, one blank-line separated block at a time
+        paragraph = []
         try:
             with open(markdown_path, 'r', encoding='utf-8') as file:
                 for line in file:
-                    tokens = enc.encode(line)
-                    token_total += len(tokens)
-                    if token_total > max_tokens:
-                        break
-                    text += line
+                    paragraph.append(line)
+                    if not line.strip():
+                        yield "".join(paragraph)
+                        paragraph = []
         except FileNotFoundError:
             logging.error(f"File not found: {markdown_path}")
-        return text
+        if paragraph:
+            yield "".join(paragraph)
+
+    @staticmethod
+    def windows(markdown_path: str, max_tokens: int = 16000) -> Iterator[str]:
+        # Covers the whole document as consecutive token-budgeted windows, each token is encoded once
+        return chunk_stream(MarkdownScraper.iter_paragraphs(markdown_path), max_tokens, page_breaks=False)
+
+    @staticmethod
+    def scrape(markdown_path: str, max_tokens: int = 16000) -> str:
+        # Only the first window, for callers that want a single prompt-sized prefix
+        return next(MarkdownScraper.windows(markdown_path, max_tokens), "")
+
+
+class QuizRowParser:
+    # Stray markdown the model sometimes wraps around the rows
+    HEADER_PATTERN = re.compile(r"^\W*questions?\W*[|,\t]\W*answers?\W*$", re.IGNORECASE)
+    TABLE_RULE_PATTERN = re.compile(r"^[\s|:\-]+$")
+    LIST_MARKER_PATTERN = re.compile(r"^(?:\d+[.)]|[-*\u2022]|Q\d*[:.])\s+", re.IGNORECASE)
+
+    def __init__(self):
+        # Only the unfinished last line is buffered, so memory does not grow with the quiz
+        self.buffer = ""
+        self.pending_question = None
+        self.rows = 0
+        self.repaired = 0
+        self.skipped = 0
+
+    @classmethod
+    def parse(cls, text: str) -> list[tuple[str, str]]:
+        parser = cls()
+        return parser.feed(text) + parser.close()
+
+    def feed(self, text: str) -> list[tuple[str, str]]:
+        # Returns the rows completed by this piece of the response
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        return [row for line in lines if (row := self.parse_line(line))]
+
+    def close(self) -> list[tuple[str, str]]:
+        rows = [row] if (row := self.parse_line(self.buffer)) else []
+        self.buffer = ""
+        if self.pending_question is not None:
+            logging.warning(f"Dropped question without an answer: {self.pending_question}")
+            self.pending_question = None
+            self.skipped += 1
+        return rows
+
+    @staticmethod
+    def split_outside_code(line: str) -> tuple[str, str] | None:
+        # Splits on the first '|' that is not inside `backticks`, so code such as `a | b` stays intact
+        in_code = False
+        for index, char in enumerate(line):
+            if char == "`":
+                in_code = not in_code
+            elif char == "|" and not in_code:
+                return line[:index], line[index + 1:]
+        # Unbalanced backticks: fall back to the first separator anywhere
+        if "|" in line:
+            question, answer = line.split("|", 1)
+            return question, answer
+        return None
+
+    def parse_line(self, line: str) -> tuple[str, str] | None:
+        line = line.strip()
+        if not line or line.startswith("```") or self.TABLE_RULE_PATTERN.match(line) or self.HEADER_PATTERN.match(line):
+            return None
+        if line.startswith("|") and line.endswith("|") and line.count("|") >= 3:
+            # Markdown table row: | question | answer |
+            line = line[1:-1]
+            self.repaired += 1
+        line = self.LIST_MARKER_PATTERN.sub("", line)
+
+        parts = self.split_outside_code(line)
+        if parts is None:
+            if self.pending_question is not None:
+                # Missing separator: the answer came on the line after its question
+                question, self.pending_question = self.pending_question, None
+                return self.accept(question, line, repaired=True)
+            if line.endswith("?"):
+                self.pending_question = line
+            else:
+                logging.warning(f"Skipped quiz line without a separator: {line}")
+                self.skipped += 1
+            return None
+
+        question, answer = (part.strip() for part in parts)
+        if self.pending_question is not None:
+            logging.warning(f"Dropped question without an answer: {self.pending_question}")
+            self.pending_question = None
+            self.skipped += 1
+        if not answer:
+            # "question|" with the answer on the next line
+            self.pending_question = question
+            return None
+        return self.accept(question, answer)
+
+    def accept(self, question: str, answer: str, repaired: bool = False) -> tuple[str, str] | None:
+        if not question:
+            self.skipped += 1
+            return None
+        self.rows += 1
+        self.repaired += repaired
+        return question, answer
 
 
 class QuizGenerator:
     def __init__(self, api_key: str):
-        openai.api_key = api_key
+        self.client = OpenAIClient(api_key=api_key, cache=get_llm_cache())
 
     def generate(self, num_questions: int, facts: str) -> str:
+        return self.client.run(self.generate_async(num_questions, facts))
+
+    @staticmethod
+    def messages(num_questions: int, facts: str) -> list[dict]:
+        return [
+            {"role": "system", "content":   f"You are a quiz creator. Please create up to {num_questions} hard quiz questions based on the concepts from the following lecture slides.\n"
+                                            "Respond in CSV format with two columns: 'question' and 'answer'. "
+                                            "Ensure that all punctuation, including apostrophes, is correctly formatted. For any code snippets or syntax, use single backticks ( ` ) for clarity. "
+                                            "Do **not** include a header row, column names, or extra punctuation in your response. "
+                                            "Each question and answer pair should be on a new line, properly separated.\n\n"
+                                            "Example:\n"
+                                            "How many countries are in the world?|95 countries\n"
+                                            "How many planets are in the solar system?|8 planets\n"},
+            {"role": "user", "content": f"Lecture slides: {facts}"},
+        ]
+
+    async def generate_async(self, num_questions: int, facts: str, label: str = "Total") -> str:
         try:
-            response = openai.chat.completions.create(
+            response = await self.client.chat(
                 model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content":   f"You are a quiz creator. Please create up to {num_questions} hard quiz questions based on the concepts from the following lecture slides.\n"
-                                                    "Respond in CSV format with two columns: 'question' and 'answer'. "
-                                                    "Ensure that all punctuation, including apostrophes, is correctly formatted. For any code snippets or syntax, use single backticks ( ` ) for clarity. "
-                                                    "Do **not** include a header row, column names, or extra punctuation in your response. "
-                                                    "Each question and answer pair should be on a new line, properly separated.\n\n"
-                                                    "Example:\n"
-                                                    "How many countries are in the world?|95 countries\n"
-                                                    "How many planets are in the solar system?|8 planets\n"},
-                    {"role": "user", "content": f"Lecture slides: {facts}"},
-                ],
+                messages=self.messages(num_questions, facts),
                 temperature=0.6
             )
-            logging.info(f"Total tokens used: {response.usage.total_tokens}")
-            return response.choices[0].message.content
+            logging.info(f"{label} tokens used: {response.total_tokens}{' (cached)' if response.cached else ''}")
+            return response.content
         except Exception as e:
             logging.error(f"Failed to generate quiz: {e}")
             return ""
 
+    async def stream_rows(
+        self, num_questions: int, facts: str, label: str = "Total"
+    ) -> AsyncIterator[tuple[str, str]]:
+        # Yields (question, answer) rows while the response is still being generated
+        parser = QuizRowParser()
+        stats = StreamStats()
+        try:
+            async for delta in self.client.stream_chat(
+                "gpt-4o-mini", self.messages(num_questions, facts), stats=stats, temperature=0.6
+            ):
+                for row in parser.feed(delta):
+                    yield row
+        except Exception as e:
+            logging.error(f"Quiz stream broke, keeping the rows received so far: {e}")
+        for row in parser.close():
+            yield row
+        logging.info(
+            f"{label} tokens used: {stats.prompt_tokens + stats.completion_tokens}"
+            f"{' (cached)' if stats.cached else ''}, "
+            f"{parser.rows} rows ({parser.repaired} repaired, {parser.skipped} skipped)"
+        )
+
+    def generate_to_csv(
+        self, requests: list[tuple[int, int, str]], file_manager: "FileManager", max_parallel: int
+    ) -> int:
+        # Streams (num_questions, keep, facts) requests concurrently and appends rows to the CSV as they arrive
+        return self.client.run(self.fan_out(requests, file_manager, max_parallel))
+
+    async def fan_out(
+        self, requests: list[tuple[int, int, str]], file_manager: "FileManager", max_parallel: int
+    ) -> int:
+        from near_duplicates import THRESHOLD, NearDuplicateFilter, similarity
+
+        semaphore = asyncio.Semaphore(max_parallel)
+        # Drops questions that repeat or paraphrase one from another section. Similar wordings often ask
+        # different things ("default port for HTTP?" and "... HTTPS?"), so a row is only a duplicate when
+        # its question matches an earlier one and their answers match as well
+        questions = NearDuplicateFilter()
+        answers: dict[int, str] = {}
+        written, duplicates = 0, 0
+
+        async def section(index: int, num_questions: int, keep: int, facts: str, append) -> None:
+            nonlocal written, duplicates
+            kept = 0
+            async with semaphore:
+                async for question, answer in self.stream_rows(num_questions, facts, f"Section {index}"):
+                    if any(similarity(answer, answers[key]) >= THRESHOLD for key in questions.find_all(question)):
+                        duplicates += 1
+                    elif kept < keep:
+                        # Each section keeps at most its share, so the quiz covers the whole document; only kept
+                        # rows are recorded, so rows beyond a share never block questions from other sections
+                        answers[questions.insert(question)] = answer
+                        append((question, answer))
+                        kept += 1
+                        written += 1
+
+        with file_manager.appender() as append:
+            await asyncio.gather(*(
+                section(index, num_questions, keep, facts, append)
+                for index, (num_questions, keep, facts) in enumerate(requests, 1)
+            ))
+        logging.info(f"Wrote {written} questions, removed {duplicates} near-duplicates")
+        return written
+
 
 class FileManager:
     def __init__(self, filename: str):
         self.filename = filename
 
+    @staticmethod
+    def csv_writer(file):
+        # Same dialect the file was written with by pandas: minimal quoting, backslash escapes, no header
+        return csv.writer(file, quoting=csv.QUOTE_MINIMAL, escapechar='\\', lineterminator=linesep)
+
     def write_csv(self, content: str) -> None:
         try:
-            # Parse the content and split into rows and columns
-            lines = content.strip().split('\n')
-            data = [line.split('|', 1) for line in lines]
-            
-            # Create a DataFrame
-            df = pd.DataFrame(data, columns=['question', 'answer'])
-            
-            # Save DataFrame to CSV
-            df.to_csv(self.filename, index=False, quoting=QUOTE_MINIMAL, header=False, escapechar='\\', encoding='utf-8')
+            # Malformed lines are repaired or skipped instead of failing the whole quiz
+            rows = QuizRowParser.parse(content)
+            with open(self.filename, mode='w', newline='', encoding='utf-8') as file:
+                self.csv_writer(file).writerows(rows)
             logging.info(f"Data written to {self.filename} successfully.")
         except Exception as e:
-            logging.error(f"Failed to write CSV with pandas: {e}")
+            logging.error(f"Failed to write CSV: {e}")
+
+    @contextmanager
+    def appender(self) -> Iterator[Callable[[tuple[str, str]], None]]:
+        # Appends rows one at a time, each is flushed to disk as soon as it is written
+        with open(self.filename, mode='a', newline='', encoding='utf-8') as file:
+            writer = self.csv_writer(file)
+
+            def append(row: tuple[str, str]) -> None:
+                writer.writerow(row)
+                file.flush()
+
+            yield append
 
     def truncate(self) -> None:
         try:
@@ -114,24 +306,64 @@ class InputHandler:
 
 class QuizApp:
     DATABASE_FILE = "data.csv"
+    WINDOW_TOKENS = 16000  # Notes are sent to the model in windows of at most this many tokens
+    COVER_FULL_DOCUMENT = True  # Spread the questions over every window instead of only the first
+    FAN_OUT = True  # Split the notes into smaller sections and request their questions concurrently
+    QUESTIONS_PER_REQUEST = 20  # Sections are made small enough that no request asks for much more
+    MIN_SECTION_TOKENS = 500
+    MAX_PARALLEL_REQUESTS = 8
+    OVERSAMPLE = 1.15  # Ask for extra questions to make up for the near-duplicates removed afterwards
 
     def __init__(self):
         Logger.setup()
         self.api_key = getenv("OPENAI_API_KEY") #or input("Enter your OpenAI API key: ")
         self.file_manager = FileManager(self.DATABASE_FILE)
 
+    @staticmethod
+    def allocate_questions(num_questions: int, windows: list[str]) -> list[int]:
+        # Shares the questions between windows in proportion to their token counts
+        tokens = [count_tokens(window) for window in windows]
+        total = sum(tokens) or 1
+        shares = [num_questions * count // total for count in tokens]
+        # Hand out what rounding down left over to the largest windows
+        for index in sorted(range(len(windows)), key=lambda i: tokens[i], reverse=True)[:num_questions - sum(shares)]:
+            shares[index] += 1
+        return shares
+
+    def split_sections(self, source: str, num_questions: int) -> list[str]:
+        # Sizes the sections so that the questions are spread over enough requests to run in parallel
+        total_tokens = sum(count_tokens(paragraph) for paragraph in MarkdownScraper.iter_paragraphs(source))
+        requests_needed = ceil(num_questions / self.QUESTIONS_PER_REQUEST)
+        section_tokens = min(self.WINDOW_TOKENS, max(self.MIN_SECTION_TOKENS, ceil(total_tokens / requests_needed)))
+        return list(MarkdownScraper.windows(source, section_tokens))
+
     def run(self):
         source = InputHandler.get_valid_directory("Enter the markdown file name (e.g., notes.md): ")
-        text = MarkdownScraper.scrape(source)
-
         num_questions = InputHandler.get_numeric_function("How many questions do you want? (default: 20): ", 20)
 
-        generator = QuizGenerator(self.api_key)
-        quiz = generator.generate(num_questions, text)
+        if self.FAN_OUT:
+            sections = self.split_sections(source, num_questions)
+            oversample, max_parallel = self.OVERSAMPLE, self.MAX_PARALLEL_REQUESTS
+        else:
+            if self.COVER_FULL_DOCUMENT:
+                sections = list(MarkdownScraper.windows(source, self.WINDOW_TOKENS))
+            else:
+                sections = [MarkdownScraper.scrape(source, self.WINDOW_TOKENS)]
+            oversample, max_parallel = 1, 1
 
+        # Each section asks for a little more than it keeps, to make up for near-duplicates
+        requests = [
+            (ceil(share * oversample), share, section)
+            for section, share in zip(sections, self.allocate_questions(num_questions, sections))
+            if share
+        ]
+        logging.info(f"Requesting {sum(request[0] for request in requests)} questions in {len(requests)} requests")
+
+        generator = QuizGenerator(self.api_key)
         self.file_manager.truncate()
-        self.file_manager.write_csv(quiz)
-        logging.info(f"Finished generating {self.DATABASE_FILE}")
+        written = generator.generate_to_csv(requests, self.file_manager, max_parallel)
+        logging.info(f"Finished generating {self.DATABASE_FILE} with {written} of {num_questions} questions")
+        get_llm_cache().log_stats()
 
 
 if __name__ == "__main__":
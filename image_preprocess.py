@@ -0,0 +1,177 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from os import cpu_count
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+from pdf2image import convert_from_path
+from PIL import Image
+
+from pdf_pages import page_windows
+
+PROBE_DPI = 72  # Resolution of the cheap first render used to measure the page
+TARGET_LINE_HEIGHT = 40  # Text line height in pixels that Tesseract reads best
+MIN_DPI, MAX_DPI = 100, 400
+MIN_INK_RATIO = 0.002  # Pages with less dark area than this are treated as blank
+MIN_GREY_STD = 3  # Pages whose grey levels vary less than this are flat and have no ink
+MIN_CONTRAST = 48  # Grey levels that must separate the mean ink shade from the mean background shade
+CROP_PADDING = 12  # Pixels of white kept around the cropped content
+
+
+def to_grayscale(image: Image.Image) -> np.ndarray:
+    """Returns the image as a 2-D uint8 array."""
+    return np.asarray(image.convert("L"), dtype=np.uint8)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Returns the grey level that best separates ink from background (Otsu's method)."""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    weight_background = np.cumsum(histogram)
+    weight_foreground = weight_background[-1] - weight_background
+    cumulative_mean = np.cumsum(histogram * levels)
+    mean_background = cumulative_mean / np.maximum(weight_background, 1)
+    mean_foreground = (cumulative_mean[-1] - cumulative_mean) / np.maximum(weight_foreground, 1)
+    between_class_variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+    return int(np.argmax(between_class_variance))
+
+
+def ink_mask(gray: np.ndarray, min_contrast: int = MIN_CONTRAST) -> np.ndarray:
+    """Binarizes a grayscale page; True marks ink pixels. A page without real contrast has no ink at all."""
+    no_ink = np.zeros(gray.shape, dtype=bool)
+    if gray.std() < MIN_GREY_STD:
+        return no_ink
+    # Otsu splits any histogram in two, even the scanner noise of an empty page, so the halves must differ clearly
+    ink = gray <= otsu_threshold(gray)
+    if ink.all() or gray[~ink].mean() - gray[ink].mean() < min_contrast:
+        return no_ink
+    return ink
+
+
+def line_runs(ink: np.ndarray) -> np.ndarray:
+    """Returns the heights of the horizontal bands of rows that contain ink (the text lines)."""
+    rows = np.concatenate(([0], ink.any(axis=1).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(rows))
+    return edges[1::2] - edges[0::2]
+
+
+def estimate_line_height(ink: np.ndarray) -> float | None:
+    """Returns the median text line height in pixels, or None if the page has no text-like lines."""
+    runs = line_runs(ink)
+    runs = runs[runs >= 3]
+    return float(np.median(runs)) if runs.size else None
+
+
+def is_blank(ink: np.ndarray, min_ink_ratio: float = MIN_INK_RATIO) -> bool:
+    """Returns True for empty or near-empty pages such as divider slides and scanned blank backs."""
+    return ink.mean() < min_ink_ratio or estimate_line_height(ink) is None
+
+
+def choose_dpi(line_height: float, probe_dpi: int = PROBE_DPI, target: int = TARGET_LINE_HEIGHT) -> int:
+    """Scales the probe resolution so text lines come out at the target height."""
+    return int(np.clip(round(probe_dpi * target / line_height / 10) * 10, MIN_DPI, MAX_DPI))
+
+
+def crop_to_content(array: np.ndarray, ink: np.ndarray, padding: int = CROP_PADDING) -> np.ndarray:
+    """Crops the margins around the ink, keeping a little padding."""
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    if not rows.size:
+        return array
+    top, bottom = max(rows[0] - padding, 0), min(rows[-1] + padding + 1, array.shape[0])
+    left, right = max(cols[0] - padding, 0), min(cols[-1] + padding + 1, array.shape[1])
+    return array[top:bottom, left:right]
+
+
+def preprocess(image: Image.Image, dpi: int = None) -> Image.Image | None:
+    """Converts a page to a cropped black-and-white image, or returns None if the page is blank."""
+    gray = to_grayscale(image)
+    ink = ink_mask(gray)
+    if is_blank(ink):
+        return None
+
+    binary = np.where(ink, 0, 255).astype(np.uint8)
+    result = Image.fromarray(crop_to_content(binary, ink))
+    if dpi:
+        result.info["dpi"] = (dpi, dpi)
+    return result
+
+
+def preprocess_window(
+    pdf_file: Path,
+    window: list[int],
+    probe_dpi: int = PROBE_DPI,
+    render_slots: threading.Semaphore = None,
+    **convert_kwargs,
+) -> list[tuple[int, Image.Image | None]]:
+    """Probes a run of consecutive pages with one render, then renders and preprocesses the pages that have text.
+
+    Neighbouring pages that call for the same DPI are rendered together, so a window usually costs two renders.
+    ``render_slots`` is an optional semaphore held during each render.
+    """
+    with render_slots or nullcontext():
+        probes = convert_from_path(
+            pdf_file, dpi=probe_dpi, first_page=window[0], last_page=window[-1], grayscale=True, **convert_kwargs
+        )
+    dpis = {}
+    for page_number, probe in zip(window, probes):
+        probe_ink = ink_mask(to_grayscale(probe))
+        probe.close()
+        if not is_blank(probe_ink):
+            dpis[page_number] = choose_dpi(estimate_line_height(probe_ink), probe_dpi)
+    del probes
+
+    runs = []
+    for page_number in window:
+        if page_number not in dpis:
+            continue
+        if runs and runs[-1][0] == dpis[page_number] and runs[-1][1][-1] == page_number - 1:
+            runs[-1][1].append(page_number)
+        else:
+            runs.append((dpis[page_number], [page_number]))
+
+    processed = {}
+    for dpi, run in runs:
+        with render_slots or nullcontext():
+            images = convert_from_path(
+                pdf_file, dpi=dpi, first_page=run[0], last_page=run[-1], grayscale=True, **convert_kwargs
+            )
+        for page_number, image in zip(run, images):
+            processed[page_number] = preprocess(image, dpi)
+            image.close()
+        del images
+    return [(page_number, processed.get(page_number)) for page_number in window]
+
+
+def iter_preprocessed_pages(
+    pdf_file: Path,
+    pages: Iterable[int],
+    probe_dpi: int = PROBE_DPI,
+    window_size: int = 4,
+    max_workers: int = None,
+    render_slots: threading.Semaphore = None,
+    **convert_kwargs,
+) -> Iterator[tuple[int, Image.Image | None]]:
+    """Yields (page_number, image) in page order with each page rendered at its own DPI and preprocessed.
+
+    Pages are handled ``window_size`` at a time by preprocess_window, with windows rendering side by side
+    until about ``max_workers`` pages are in flight; blank pages yield None and are never rendered beyond the probe.
+    """
+    convert_kwargs.pop("dpi", None)
+    max_workers = max_workers or cpu_count() or 1
+    # Rendered windows wait here until the caller takes them, so the lookahead is bounded in pages, not windows:
+    # at most max_workers + window_size - 1 preprocessed pages are held however the two are chosen
+    lookahead = max(1, -(-max_workers // window_size))
+    with ThreadPoolExecutor(max_workers=lookahead) as executor:
+        pending = deque()
+        for window in page_windows(pages, window_size):
+            pending.append(
+                executor.submit(preprocess_window, pdf_file, window, probe_dpi, render_slots, **convert_kwargs)
+            )
+            if len(pending) >= lookahead:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,158 @@
+import asyncio
+import csv
+import os
+import shlex
+import signal
+import sys
+from dataclasses import dataclass
+from graphlib import TopologicalSorter
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Iterable, Mapping
+
+MAX_PARALLEL_INSTALLS = 4
+INSTALL_TIMEOUT = 30 * 60  # Seconds before a hung installer is killed
+OUTPUT_TAIL = 500  # Characters of installer output kept in the summary
+
+
+@dataclass
+class InstallResult:
+    """The outcome of one install."""
+
+    name: str
+    status: str  # "installed", "failed", "timeout", "skipped" or "error"
+    duration: float = 0.0
+    returncode: int | None = None
+    stdout: str = ""
+    stderr: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "installed"
+
+
+def command_template(template: str) -> Callable[[str], list[str]]:
+    """Turns a command line such as "winget install --id {name} --silent" into a command builder."""
+    arguments = shlex.split(template)
+    if not any("{name}" in argument for argument in arguments):
+        raise ValueError(f"Installer command has no {{name}} placeholder: {template}")
+    return lambda name: [argument.replace("{name}", name) for argument in arguments]
+
+
+class InstallScheduler:
+    """Runs installs concurrently up to a limit, starting a package only after the packages it must follow.
+
+    ``after`` maps a package to the packages that have to be installed first. Constraints on packages
+    that are not being installed are ignored, and a package whose prerequisite failed is skipped.
+    """
+
+    def __init__(
+        self,
+        command_for: Callable[[str], list[str]],
+        max_parallel: int = MAX_PARALLEL_INSTALLS,
+        timeout: float = INSTALL_TIMEOUT,
+        after: Mapping[str, Iterable[str]] | None = None,
+    ) -> None:
+        """Configures the installer command builder, the concurrency limit and the per-install timeout."""
+        self.command_for = command_for
+        self.max_parallel = max_parallel
+        self.timeout = timeout
+        self.after = {name: set(prerequisites) for name, prerequisites in (after or {}).items()}
+
+    def run(self, packages: Iterable[str]) -> list[InstallResult]:
+        """Installs the packages and returns one result per package, in the order given."""
+        return asyncio.run(self.run_async(packages))
+
+    async def run_async(self, packages: Iterable[str]) -> list[InstallResult]:
+        """Installs the packages from a running event loop."""
+        packages = list(dict.fromkeys(packages))
+        graph = {name: self.after.get(name, set()) & set(packages) for name in packages}
+        # Raises graphlib.CycleError up front instead of deadlocking on packages that wait for each other
+        TopologicalSorter(graph).prepare()
+
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def install_when_ready(name: str) -> InstallResult:
+            for prerequisite in graph[name]:
+                if not (await tasks[prerequisite]).ok:
+                    result = InstallResult(name, "skipped", stderr=f"{prerequisite} was not installed")
+                    print(f"Skipping {name}: {result.stderr}.")
+                    return result
+            async with semaphore:
+                return await self._install(name)
+
+        for name in packages:
+            tasks[name] = asyncio.create_task(install_when_ready(name))
+        return list(await asyncio.gather(*tasks.values()))
+
+    async def _install(self, name: str) -> InstallResult:
+        """Runs one installer process, reading its output as it runs and killing it after the timeout."""
+        command = self.command_for(name)
+        print(f"Installing {name} using {Path(command[0]).name}...")
+        start = perf_counter()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                # A session of its own lets a timeout kill the installer's children along with it
+                start_new_session=sys.platform != "win32",
+            )
+        except OSError as error:
+            print(f"Error installing {name}: {error}")
+            return InstallResult(name, "error", perf_counter() - start, stderr=str(error))
+
+        try:
+            # communicate() drains both pipes concurrently, so a chatty installer never blocks on a full pipe
+            stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+        except asyncio.TimeoutError:
+            _kill(process)
+            await process.wait()
+            print(f"Installing {name} timed out after {self.timeout:.0f}s.")
+            return InstallResult(name, "timeout", perf_counter() - start, process.returncode)
+
+        duration = perf_counter() - start
+        result = InstallResult(
+            name,
+            "installed" if process.returncode == 0 else "failed",
+            duration,
+            process.returncode,
+            stdout.decode(errors="replace")[-OUTPUT_TAIL:],
+            stderr.decode(errors="replace")[-OUTPUT_TAIL:],
+        )
+        if result.ok:
+            print(f"{name} installed successfully in {duration:.1f}s.")
+        else:
+            print(f"Failed to install {name}. Error: {result.stderr.strip() or result.stdout.strip()}")
+        return result
+
+
+def _kill(process: asyncio.subprocess.Process) -> None:
+    """Kills an installer and, outside Windows, every process it started."""
+    try:
+        if sys.platform == "win32":
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def write_summary(results: list[InstallResult], filename: str = "database/install_summary.csv") -> None:
+    """Writes one row per install with its status, duration and the end of its error output."""
+    Path(filename).parent.mkdir(parents=True, exist_ok=True)
+    with open(filename, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Software Name", "Status", "Duration (s)", "Return Code", "Error"])
+        for result in results:
+            writer.writerow([
+                result.name, result.status, f"{result.duration:.1f}",
+                "" if result.returncode is None else result.returncode, result.stderr.strip(),
+            ])
+
+    failures = [result for result in results if not result.ok]
+    total = sum(result.duration for result in results)
+    print(f"{len(results) - len(failures)} of {len(results)} installed, {total:.1f}s of install time; "
+          f"summary saved to {filename}")
+    for result in failures:
+        print(f" ! {result.name}: {result.status}")
@@ -1,35 +1,31 @@
-import json
 import logging
-from os import getenv
 import csv
+from itertools import chain, islice
+
+from quiz_store import QuizStore
 
 # Constant
 PDF_DIRECTORY = "pdf"
-DATABASE_FILE = "database/data.json"
+DATABASE_FILE = "database/data.json"  # Legacy single-quiz file, imported into the quiz store once
 
 
 def write_csv(data, filename):
+    # data can be any iterable of questions, such as QuizStore.iter_questions, so a quiz is never held in memory
+    questions = iter(data)
+    # Taking the first question before opening the file means a missing quiz raises with the old CSV intact
+    first = list(islice(questions, 1))
     with open(filename, 'w', encoding='utf-8', newline='') as csvfile:
         writer = csv.writer(csvfile)
-        for question in data:
+        for question in chain(first, questions):
             writer.writerow([question["question"], question["answer"]])
 
 
 def main():
     quiz_name = input("Quiz name: ")
 
-    with open(DATABASE_FILE, "r") as database:
-        try:
-            data = json.load(database)
-        except json.decoder.JSONDecodeError:
-            with open("database/data.json", "w") as database:
-                data = {'api_key': getenv('OPENAI_API_KEY'), 'quiz': {}}
-                json.dump(data, database)
-
-        if data['api_key'] == "":
-            pass
-        else:
-            api_key = data['api_key']
+    store = QuizStore()
+    if not store.quiz_names():
+        store.import_json(DATABASE_FILE)
 
     user_input = {
         "quiz_name": quiz_name,
@@ -74,16 +70,12 @@ def main():
 
     }
 
-    new_quiz = {'quiz_name': quiz_name, "questions": user_input["questions"]}
-    with open(DATABASE_FILE, "r") as database:
-        data = json.load(database)
-        data['quiz'] = new_quiz
-        with open(DATABASE_FILE, "w") as database:
-            json.dump(data, database)
+    # Only this quiz is rewritten, in one transaction; every other quiz stays as it was
+    if quiz_name in store.quiz_names():
+        logging.info(f"Replacing the questions of quiz '{quiz_name}'")
+    store.replace_questions(quiz_name, user_input["questions"])
 
-    user_input = user_input
-    csv_data = user_input['questions']
-    write_csv(csv_data, 'data.csv')
+    write_csv(store.iter_questions(quiz_name), 'data.csv')
 
     logging.info("Finished generating csv file")
 
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from os import getenv
+from pathlib import Path
+from time import time
+
+CACHE_PATH = Path(__file__).resolve().parent / ".cache" / "llm_cache.sqlite3"
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+TTL_SECONDS = 30 * 24 * 60 * 60
+# Set LLM_CACHE_SKIP_SAMPLED=1 to send requests sampled at a temperature above zero to the model every time
+SKIP_SAMPLED = getenv("LLM_CACHE_SKIP_SAMPLED", "").lower() in ("1", "true", "yes")
+
+
+def request_key(backend: str, model: str, messages: list[dict], params: dict) -> str:
+    """Hashes everything that determines a model's reply: backend, model, prompts and sampling parameters."""
+    payload = json.dumps(
+        {"backend": backend, "model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """A persistent cache of model replies with TTL and size-based LRU eviction."""
+
+    def __init__(
+        self,
+        path: Path = CACHE_PATH,
+        max_bytes: int = MAX_CACHE_BYTES,
+        ttl_seconds: float = TTL_SECONDS,
+        skip_sampled: bool = False,
+    ) -> None:
+        """Opens (or creates) the SQLite cache database.
+
+        With ``skip_sampled`` set, requests with a temperature above zero bypass the cache so every
+        run gets a fresh sample.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.skip_sampled = skip_sampled
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, prompt_tokens INTEGER NOT NULL, "
+            "completion_tokens INTEGER NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, "
+            "last_access REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_lru ON llm_cache (last_access)")
+        self._connection.commit()
+        self._total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def applies_to(self, params: dict) -> bool:
+        """Returns False for requests that opted out of caching."""
+        return not (self.skip_sampled and params.get("temperature", 1.0) > 0)
+
+    def get(self, key: str) -> tuple[str, int, int] | None:
+        """Returns (content, prompt_tokens, completion_tokens) for a fresh entry, or None on a miss."""
+        now = time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content, prompt_tokens, completion_tokens, size, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[4] > self.ttl_seconds:
+                # Expired entries are removed on sight
+                self._connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._connection.commit()
+                self._total_bytes -= row[3]
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.tokens_saved += row[1] + row[2]
+            self._connection.execute(
+                "UPDATE llm_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._connection.commit()
+            return row[0], row[1], row[2]
+
+    def put(self, key: str, content: str, prompt_tokens: int, completion_tokens: int) -> None:
+        """Stores a reply and evicts least recently used entries above the size limit."""
+        size = len(content.encode("utf-8"))
+        now = time()
+        with self._lock:
+            previous = self._connection.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(key, content, prompt_tokens, completion_tokens, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, content, prompt_tokens, completion_tokens, size, now, now),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict(now)
+            self._connection.commit()
+
+    def _evict(self, now: float) -> None:
+        """Deletes expired entries, then least recently used ones until the cache fits in max_bytes."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        self._connection.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl_seconds,))
+        self._total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        while self._total_bytes > self.max_bytes:
+            rows = self._connection.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                self._connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    return
+
+    @property
+    def stats(self) -> dict:
+        """Returns this run's hits, misses and saved tokens, plus the lifetime token savings."""
+        with self._lock:
+            lifetime_saved = self._connection.execute(
+                "SELECT COALESCE(SUM(hits * (prompt_tokens + completion_tokens)), 0) FROM llm_cache"
+            ).fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "tokens_saved": self.tokens_saved,
+            "lifetime_tokens_saved": lifetime_saved,
+            "bytes": self._total_bytes,
+        }
+
+    def log_stats(self) -> None:
+        """Logs the cache statistics for this run."""
+        stats = self.stats
+        logging.info(
+            f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, {stats['tokens_saved']} tokens saved "
+            f"({stats['lifetime_tokens_saved']} across all runs)."
+        )
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache(skip_sampled: bool | None = None) -> LLMCache:
+    """Returns the process-wide LLM response cache, opening it on first use.
+
+    ``skip_sampled`` defaults to SKIP_SAMPLED; passing it changes the setting of the shared cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(skip_sampled=SKIP_SAMPLED if skip_sampled is None else skip_sampled)
+        elif skip_sampled is not None:
+            _cache.skip_sampled = skip_sampled
+        return _cache
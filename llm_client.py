@@ -0,0 +1,463 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from os import getenv
+from time import monotonic
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, TypeVar
+
+from llm_cache import LLMCache, request_key
+from text_chunker import count_tokens
+
+if TYPE_CHECKING:
+    import httpx
+
+T = TypeVar("T")
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when a request to a language model fails and will not be retried."""
+
+
+@dataclass
+class ChatResult:
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+@dataclass
+class StreamStats:
+    """Timing and usage of one streamed completion."""
+
+    started: float = 0.0
+    first_token_at: float | None = None
+    finished_at: float | None = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached: bool = False
+
+    @property
+    def time_to_first_token(self) -> float | None:
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def tokens_per_second(self) -> float:
+        if self.first_token_at is None or self.finished_at is None or self.finished_at <= self.first_token_at:
+            return 0.0
+        return self.completion_tokens / (self.finished_at - self.first_token_at)
+
+
+class RateLimiter:
+    """Token-bucket limiter for requests per minute and tokens per minute."""
+
+    def __init__(self, requests_per_minute: int = None, tokens_per_minute: int = None) -> None:
+        """Initializes full buckets; a limit of None disables that bucket."""
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = monotonic()
+
+    def _refill(self) -> None:
+        """Adds the capacity earned since the last update, up to one minute's worth."""
+        now = monotonic()
+        elapsed_minutes = (now - self._updated) / 60
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed_minutes * self.requests_per_minute)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed_minutes * self.tokens_per_minute)
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Waits until one request and the estimated number of tokens are available, then takes them."""
+        if self.tokens_per_minute:
+            # A request larger than the whole bucket would otherwise wait forever
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            self._refill()
+            wait = 0.0
+            if self.requests_per_minute and self._requests < 1:
+                wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+            if self.tokens_per_minute and self._tokens < tokens:
+                wait = max(wait, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+            if wait == 0:
+                if self.requests_per_minute:
+                    self._requests -= 1
+                if self.tokens_per_minute:
+                    self._tokens -= tokens
+                return
+            await asyncio.sleep(wait)
+
+    def consume(self, tokens: int) -> None:
+        """Charges tokens that were only known after the response, e.g. the completion."""
+        if self.tokens_per_minute:
+            self._refill()
+            self._tokens -= tokens
+
+
+class LLMClient(ABC):
+    """Base class for asyncio chat clients with a pooled HTTP connection, rate limiting and backoff.
+
+    Subclasses describe one backend by building the request payload and parsing the response. The
+    HTTP pool is created lazily for the running event loop, so the same client can be driven from
+    several ``asyncio.run`` calls through :meth:`run`.
+    """
+
+    chat_path = ""
+
+    def __init__(
+        self,
+        base_url: str,
+        headers: dict = None,
+        max_connections: int = 16,
+        requests_per_minute: int = None,
+        tokens_per_minute: int = None,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: float = 300.0,
+        cache: LLMCache = None,
+    ) -> None:
+        """Initializes the client; no connection is opened until the first request."""
+        self.base_url = base_url.rstrip("/")
+        self.headers = headers or {}
+        self.max_connections = max_connections
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.cache = cache
+        self._loop = None
+        self._http: httpx.AsyncClient | None = None
+        self._in_flight: asyncio.Semaphore | None = None
+
+    def _connection(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        """Returns the HTTP pool and in-flight semaphore bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # httpx is imported with the first request so that scripts start without paying for it
+            import httpx
+
+            self._loop = loop
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+                ),
+            )
+            self._in_flight = asyncio.Semaphore(self.max_connections)
+        return self._http, self._in_flight
+
+    @abstractmethod
+    def build_payload(self, model: str, messages: list[dict], stream: bool = False, **params) -> dict:
+        """Returns the backend's request body for a chat request."""
+
+    @abstractmethod
+    def parse_response(self, data: dict) -> ChatResult:
+        """Returns the reply and token usage in a decoded chat response."""
+
+    @abstractmethod
+    def parse_stream_line(self, line: str) -> tuple[str, dict | None]:
+        """Returns the text delta in one line of a streamed response and its usage, if the line has any."""
+
+    def estimate_tokens(self, messages: list[dict]) -> int:
+        """Returns the prompt's token count for the rate limiter, or 0 when no token limit is set."""
+        # Counting loads a tiktoken encoding, which may need the network, so it is skipped unless it is used
+        if not self.limiter.tokens_per_minute:
+            return 0
+        return sum(count_tokens(message["content"]) for message in messages)
+
+    def backoff_delay(self, attempt: int, retry_after: str = None) -> float:
+        """Returns the jittered exponential delay before the given retry attempt."""
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def send(self, path: str, payload: dict, estimated_tokens: int = 0, stream: bool = False) -> httpx.Response:
+        """Sends a JSON payload, retrying rate-limited, failed and unreachable requests with backoff.
+
+        With ``stream`` set the response body is not read; the caller must close the response.
+        """
+        import httpx
+
+        http, in_flight = self._connection()
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(estimated_tokens)
+            try:
+                request = http.build_request("POST", path, json=payload)
+                if stream:
+                    response = await http.send(request, stream=True)
+                else:
+                    async with in_flight:
+                        response = await http.send(request)
+            except httpx.TransportError as error:
+                if attempt == self.max_retries:
+                    raise LLMError(f"Request to {self.base_url}{path} failed: {error}") from error
+                delay = self.backoff_delay(attempt)
+                logging.warning(f"{error.__class__.__name__} from {self.base_url}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                await response.aclose()
+                delay = self.backoff_delay(attempt, response.headers.get("retry-after"))
+                logging.warning(f"HTTP {response.status_code} from {self.base_url}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code >= 400:
+                body = (await response.aread()).decode("utf-8", "replace")
+                await response.aclose()
+                raise LLMError(f"HTTP {response.status_code} from {self.base_url}{path}: {body[:500]}")
+            return response
+
+        raise LLMError(f"Request to {self.base_url}{path} failed after {self.max_retries} retries")
+
+    async def post(self, path: str, payload: dict, estimated_tokens: int = 0) -> dict:
+        """Posts a JSON payload with retries and returns the decoded JSON response."""
+        response = await self.send(path, payload, estimated_tokens)
+        return response.json()
+
+    async def chat(self, model: str, messages: list[dict], **params) -> ChatResult:
+        """Sends a chat request and returns the reply with its token usage, serving repeats from the cache."""
+        key = None
+        if self.cache is not None and self.cache.applies_to(params):
+            key = request_key(self.__class__.__name__, model, messages, params)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return ChatResult(*cached, cached=True)
+
+        estimated_tokens = self.estimate_tokens(messages)
+        data = await self.post(self.chat_path, self.build_payload(model, messages, **params), estimated_tokens)
+        result = self.parse_response(data)
+        self.limiter.consume(max(0, result.total_tokens - estimated_tokens))
+        if key is not None:
+            self.cache.put(key, result.content, result.prompt_tokens, result.completion_tokens)
+        return result
+
+    async def stream_chat(
+        self, model: str, messages: list[dict], stats: StreamStats = None, **params
+    ) -> AsyncIterator[str]:
+        """Streams a chat reply, yielding text deltas as the server sends them.
+
+        ``stats`` (if given) is filled with time-to-first-token, token counts and throughput. Retries
+        only happen before the first byte; a stream that breaks midway raises LLMError, and whatever
+        the caller already consumed is theirs to keep. Cached replies are yielded in one piece.
+        """
+        stats = stats if stats is not None else StreamStats()
+        stats.started = monotonic()
+
+        key = None
+        if self.cache is not None and self.cache.applies_to(params):
+            key = request_key(self.__class__.__name__, model, messages, params)
+            cached = self.cache.get(key)
+            if cached is not None:
+                stats.first_token_at = stats.finished_at = monotonic()
+                stats.prompt_tokens, stats.completion_tokens, stats.cached = cached[1], cached[2], True
+                yield cached[0]
+                return
+
+        import httpx
+
+        estimated_tokens = self.estimate_tokens(messages)
+        payload = self.build_payload(model, messages, stream=True, **params)
+        _, in_flight = self._connection()
+        parts, delta_count = [], 0
+
+        async with in_flight:
+            response = await self.send(self.chat_path, payload, estimated_tokens, stream=True)
+            try:
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    delta, usage = self.parse_stream_line(line)
+                    if usage:
+                        stats.prompt_tokens = usage.get("prompt_tokens", stats.prompt_tokens)
+                        stats.completion_tokens = usage.get("completion_tokens", stats.completion_tokens)
+                    if delta:
+                        if stats.first_token_at is None:
+                            stats.first_token_at = monotonic()
+                        delta_count += 1
+                        parts.append(delta)
+                        yield delta
+            except httpx.HTTPError as error:
+                raise LLMError(f"Stream from {self.base_url} broke after {delta_count} chunks: {error}") from error
+            except json.JSONDecodeError as error:
+                raise LLMError(
+                    f"Malformed line in stream from {self.base_url} after {delta_count} chunks: {error}"
+                ) from error
+            finally:
+                stats.finished_at = monotonic()
+                await response.aclose()
+
+        # Servers that omit usage still get an estimate of one token per streamed chunk
+        stats.completion_tokens = stats.completion_tokens or delta_count
+        self.limiter.consume(max(0, stats.prompt_tokens + stats.completion_tokens - estimated_tokens))
+        if key is not None:
+            self.cache.put(key, "".join(parts), stats.prompt_tokens, stats.completion_tokens)
+
+    async def aclose(self) -> None:
+        """Closes the HTTP pool of the running event loop."""
+        if self._http is not None and self._loop is asyncio.get_running_loop():
+            await self._http.aclose()
+        self._loop = self._http = self._in_flight = None
+
+    def run(self, coroutine: Awaitable[T]) -> T:
+        """Runs a coroutine that uses this client to completion from synchronous code."""
+
+        async def run_and_close():
+            try:
+                return await coroutine
+            finally:
+                await self.aclose()
+
+        return asyncio.run(run_and_close())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+class OpenAIClient(LLMClient):
+    """Chat client for the OpenAI chat completions API (or any compatible server)."""
+
+    chat_path = "/chat/completions"
+
+    def __init__(self, api_key: str = None, base_url: str = None, **kwargs) -> None:
+        api_key = api_key or getenv("OPENAI_API_KEY")
+        base_url = base_url or getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        super().__init__(base_url, headers={"Authorization": f"Bearer {api_key}"}, **kwargs)
+
+    def build_payload(self, model: str, messages: list[dict], stream: bool = False, **params) -> dict:
+        payload = {"model": model, "messages": messages, **params}
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def parse_response(self, data: dict) -> ChatResult:
+        usage = data.get("usage") or {}
+        return ChatResult(
+            content=data["choices"][0]["message"]["content"],
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+        )
+
+    def parse_stream_line(self, line: str) -> tuple[str, dict | None]:
+        # Server-sent events: "data: {json}" lines, terminated by "data: [DONE]"
+        if not line.startswith("data:"):
+            return "", None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return "", None
+        event = json.loads(data)
+        choices = event.get("choices") or []
+        delta = (choices[0].get("delta") or {}).get("content") or "" if choices else ""
+        return delta, event.get("usage")
+
+
+class OllamaClient(LLMClient):
+    """Chat client for a local Ollama server."""
+
+    chat_path = "/api/chat"
+
+    def __init__(self, base_url: str = None, **kwargs) -> None:
+        base_url = base_url or getenv("OLLAMA_HOST", "http://localhost:11434")
+        if "://" not in base_url:
+            base_url = f"http://{base_url}"
+        kwargs.setdefault("max_connections", 4)
+        super().__init__(base_url, **kwargs)
+
+    def build_payload(self, model: str, messages: list[dict], stream: bool = False, **params) -> dict:
+        # Ollama takes sampling parameters under "options"
+        payload = {"model": model, "messages": messages, "stream": stream}
+        keep_alive = params.pop("keep_alive", None)
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        if params:
+            payload["options"] = params
+        return payload
+
+    def parse_response(self, data: dict) -> ChatResult:
+        return ChatResult(
+            content=data["message"]["content"],
+            prompt_tokens=data.get("prompt_eval_count", 0),
+            completion_tokens=data.get("eval_count", 0),
+        )
+
+    def parse_stream_line(self, line: str) -> tuple[str, dict | None]:
+        # Newline-delimited JSON; the final object has done=true and the token counts
+        event = json.loads(line)
+        if event.get("error"):
+            raise LLMError(f"Ollama stream error: {event['error']}")
+        delta = (event.get("message") or {}).get("content") or ""
+        usage = None
+        if event.get("done"):
+            usage = {
+                "prompt_tokens": event.get("prompt_eval_count", 0),
+                "completion_tokens": event.get("eval_count", 0),
+            }
+        return delta, usage
+
+
+async def stream_to_file(
+    client: LLMClient, path, model: str, messages: list[dict], mode: str = "w", label: str = "Total", **params
+) -> str:
+    """Streams a chat reply into a file as it arrives and returns the text written.
+
+    Each delta is flushed immediately, so a broken stream or a timeout leaves everything received so
+    far on disk. The file is only opened once the first text arrives, so a stream that fails before that
+    leaves an existing file untouched and raises LLMError, as there is nothing to keep.
+    Time-to-first-token and tokens/sec are logged when the stream ends.
+    """
+    stats = StreamStats()
+    parts = []
+    output_file = None
+    try:
+        try:
+            async for delta in client.stream_chat(model, messages, stats=stats, **params):
+                if output_file is None:
+                    output_file = open(path, mode, encoding="utf-8")
+                output_file.write(delta)
+                output_file.flush()
+                parts.append(delta)
+        except LLMError as error:
+            if not parts:
+                raise
+            logging.error(f"{label}: {error}. Kept {sum(map(len, parts))} characters of partial output in {path}.")
+            return "".join(parts)
+        if output_file is None:
+            # An empty reply still replaces (or appends nothing to) the file, as a reply with text would
+            output_file = open(path, mode, encoding="utf-8")
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+    if stats.cached:
+        logging.info(f"{label} tokens used: {stats.prompt_tokens + stats.completion_tokens} (cached)")
+    else:
+        logging.info(
+            f"{label} tokens used: {stats.prompt_tokens + stats.completion_tokens}, time to first token "
+            f"{stats.time_to_first_token or 0:.2f}s, {stats.tokens_per_second:.1f} tokens/s"
+        )
+    return "".join(parts)
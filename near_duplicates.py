@@ -0,0 +1,143 @@
+import re
+import zlib
+from typing import Hashable, Iterable, Iterator
+
+import numpy as np
+
+NUM_PERM = 128  # MinHash signature length
+BANDS = 32  # LSH bands of NUM_PERM // BANDS rows; candidates share a band at Jaccard ~(1 / BANDS) ** (1 / rows)
+THRESHOLD = 0.6  # Estimated Jaccard similarity at which two texts count as duplicates
+SHINGLE_SIZE = 4  # Character n-grams survive small rewordings better than word n-grams on short questions
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Lowercases the text and strips punctuation and repeated whitespace."""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[str]:
+    """Returns the set of character n-grams of an already normalized text."""
+    if len(text) <= size:
+        return {text}
+    return {text[index:index + size] for index in range(len(text) - size + 1)}
+
+
+def similarity(first: str, second: str) -> float:
+    """Returns the exact Jaccard similarity of two texts' shingle sets."""
+    first_shingles, second_shingles = shingles(normalize(first)), shingles(normalize(second))
+    return len(first_shingles & second_shingles) / len(first_shingles | second_shingles)
+
+
+class MinHasher:
+    """Computes MinHash signatures with a fixed family of hash permutations."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1) -> None:
+        """Draws the permutation parameters; hashers with the same seed produce comparable signatures."""
+        rng = np.random.default_rng(seed)
+        # 32-bit shingle hashes times 32-bit multipliers stay below 2**64, so uint64 arithmetic never overflows
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Returns the MinHash signature of a text's shingles."""
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(normalize(text))), dtype=np.uint64
+        )
+        return ((hashes[:, None] * self.a + self.b) % _MERSENNE_PRIME).min(axis=0)
+
+
+class NearDuplicateFilter:
+    """Detects near-duplicate texts in a stream using MinHash and locality-sensitive hashing.
+
+    Each text is compared only with the earlier texts that share at least one LSH band, so checking
+    n texts costs roughly O(n) instead of the O(n^2) of comparing every pair.
+    """
+
+    def __init__(self, threshold: float = THRESHOLD, num_perm: int = NUM_PERM, bands: int = BANDS) -> None:
+        """Initializes an empty filter."""
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(bands)]
+        self._signatures: list[np.ndarray] = []
+        self._keys: list[Hashable] = []
+        self._exact: dict[str, Hashable] = {}
+
+    def find(self, text: str) -> Hashable | None:
+        """Returns the key of an earlier text this one duplicates, or None."""
+        duplicates, _, _ = self._lookup(text, first=True)
+        return duplicates[0] if duplicates else None
+
+    def find_all(self, text: str) -> list[Hashable]:
+        """Returns the keys of every earlier text this one duplicates, oldest first."""
+        return self._lookup(text)[0]
+
+    def add(self, text: str, key: Hashable = None) -> Hashable | None:
+        """Records a text unless it duplicates an earlier one; returns the earlier text's key if it does."""
+        duplicates, normalized, signature = self._lookup(text, first=True)
+        if duplicates:
+            return duplicates[0]
+        self._record(normalized, signature, key)
+        return None
+
+    def insert(self, text: str, key: Hashable = None) -> Hashable:
+        """Records a text even if it duplicates an earlier one and returns its key.
+
+        For callers that decide on duplicates themselves, e.g. by also comparing answers.
+        """
+        normalized = normalize(text)
+        return self._record(normalized, self.hasher.signature(normalized), key)
+
+    def _record(self, normalized: str, signature: np.ndarray, key: Hashable) -> Hashable:
+        """Stores a signature in the LSH buckets under the given key, or under its index without one."""
+        index = len(self._signatures)
+        key = index if key is None else key
+        self._signatures.append(signature)
+        self._keys.append(key)
+        self._exact.setdefault(normalized, key)
+        for band, bucket in zip(self._bands(signature), self._buckets):
+            bucket.setdefault(band, []).append(index)
+        return key
+
+    def _lookup(self, text: str, first: bool = False) -> tuple[list[Hashable], str, np.ndarray | None]:
+        """Returns (keys of the earlier texts this one duplicates, normalized text, signature) for a text.
+
+        With ``first`` set the search stops at the first duplicate found.
+        """
+        normalized = normalize(text)
+        if first and normalized in self._exact:
+            return [self._exact[normalized]], normalized, None
+
+        signature = self.hasher.signature(normalized)
+        candidates = set()
+        for band, bucket in zip(self._bands(signature), self._buckets):
+            candidates.update(bucket.get(band, ()))
+        duplicates = []
+        for index in sorted(candidates):
+            if np.mean(self._signatures[index] == signature) >= self.threshold:
+                duplicates.append(self._keys[index])
+                if first:
+                    break
+        return duplicates, normalized, signature
+
+    def _bands(self, signature: np.ndarray) -> Iterator[bytes]:
+        """Splits a signature into the byte strings used as LSH bucket keys."""
+        for start in range(0, len(signature), self.rows):
+            yield signature[start:start + self.rows].tobytes()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+
+def unique(texts: Iterable[str], threshold: float = THRESHOLD) -> Iterator[str]:
+    """Yields the texts that are not near-duplicates of an earlier one."""
+    seen = NearDuplicateFilter(threshold)
+    for text in texts:
+        if seen.add(text) is None:
+            yield text
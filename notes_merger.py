@@ -1,19 +1,108 @@
-from os import listdir, path
+import hashlib
+import json
+import os
+from pathlib import Path
 from natsort import natsorted
 
+MANIFEST_SUFFIX = ".manifest.json"
+BUFFER_SIZE = 1 << 20  # Bytes copied at a time, so no note is ever held in memory whole
+SEPARATOR = b"\n"  # Written after every file
+
+
+def file_state(file_path: Path) -> dict:
+    """Returns the size and modification time that tell whether a file may have changed."""
+    stat = file_path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def file_sha256(file_path: Path) -> str:
+    """Hashes a file in BUFFER_SIZE blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(BUFFER_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(output_file: Path) -> dict:
+    """Returns the manifest written with the merged notes, or an empty one."""
+    try:
+        with open(f"{output_file}{MANIFEST_SUFFIX}", "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(output_file: Path, manifest: dict) -> None:
+    """Replaces the manifest in one step, so an interrupted write never leaves half a manifest behind."""
+    temporary = f"{output_file}{MANIFEST_SUFFIX}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temporary, f"{output_file}{MANIFEST_SUFFIX}")
+
+
+def unchanged(entry: dict, file_path: Path, state: dict) -> bool:
+    """Checks a file against its manifest entry, hashing it only if its size matches but its mtime does not."""
+    if entry["file"] != file_path.name or entry["size"] != state["size"]:
+        return False
+    return entry["mtime_ns"] == state["mtime_ns"] or entry["sha256"] == file_sha256(file_path)
+
+
+def copy_into(output, file_path: Path) -> tuple[str, int]:
+    """Appends a file and the separator to the output in fixed-size blocks, returning its hash and length."""
+    digest = hashlib.sha256()
+    length = 0
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(BUFFER_SIZE), b""):
+            digest.update(block)
+            output.write(block)
+            length += len(block)
+    output.write(SEPARATOR)
+    return digest.hexdigest(), length + len(SEPARATOR)
+
 
 def merge_notes(folder_path, output_file):
-    markdown_files = [path.join(folder_path, file) for file in listdir(folder_path) if file.endswith(".md")]
+    output_file = Path(output_file)
+    markdown_files = natsorted(
+        (file for file in Path(folder_path).iterdir()
+         if file.name.endswith(".md") and file.resolve() != output_file.resolve()),
+        key=lambda file: file.name,
+    )
+
+    # The manifest only describes the output if nothing else has written to it since
+    manifest = load_manifest(output_file)
+    trusted = output_file.exists() and manifest.get("output") == file_state(output_file)
+    previous = manifest.get("files", []) if trusted else []
+
+    # Files that match the manifest from the start are left where they are in the output
+    entries, kept = [], 0
+    for markdown_file in markdown_files:
+        state = file_state(markdown_file)
+        if kept == len(entries) and kept < len(previous) and unchanged(previous[kept], markdown_file, state):
+            entries.append({**previous[kept], "mtime_ns": state["mtime_ns"]})
+            kept += 1
+        else:
+            entries.append({"file": markdown_file.name, **state})
+
+    # Without a manifest that matches the output nothing is known to be in it, so it is always rewritten
+    if trusted and kept == len(previous) == len(entries):
+        # Saved anyway so files that were only touched are not hashed again next time
+        save_manifest(output_file, {"output": manifest["output"], "files": entries})
+        print(f"{output_file} is up to date.")
+        return
 
-    with open(output_file, "a") as output_file:
-        output_file.truncate(0)
-        for markdown_file in natsorted(markdown_files):
-            with open(markdown_file, 'r') as file:
-                file_content = file.read()
-                output_file.write(file_content + "\n")
+    offset = entries[kept - 1]["offset"] + entries[kept - 1]["length"] if kept else 0
+    with open(output_file, "r+b" if output_file.exists() else "wb") as output:
+        output.seek(offset)
+        output.truncate()
+        for entry, markdown_file in zip(entries[kept:], markdown_files[kept:]):
+            entry["sha256"], entry["length"] = copy_into(output, markdown_file)
+            entry["offset"] = offset
+            offset += entry["length"]
 
+    save_manifest(output_file, {"output": file_state(output_file), "files": entries})
     if markdown_files:
-        print(f"Markdown files merged into {folder_path}")
+        print(f"Markdown files merged into {output_file} ({len(entries) - kept} rewritten, {kept} unchanged)")
     else:
         print("No Markdown files found in the directory.")
 
@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from time import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+CACHE_PATH = Path(__file__).resolve().parent / ".cache" / "ocr_cache.sqlite3"
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def page_fingerprint(image: "Image.Image", dpi: int, lang: str, engine_version: str) -> str:
+    """Hashes the rendered page pixels together with the settings that affect OCR output."""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}|{image.size}|{dpi}|{lang}|{engine_version}|".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """A persistent, size-bounded LRU cache of OCR results keyed by page fingerprint."""
+
+    def __init__(self, path: Path = CACHE_PATH, max_bytes: int = MAX_CACHE_BYTES) -> None:
+        """Opens (or creates) the SQLite cache database."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ocr_cache_lru ON ocr_cache (last_access)")
+        self._connection.commit()
+        self._total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+
+    def get(self, key: str) -> str | None:
+        """Returns the cached text for a key and marks it as recently used, or None on a miss."""
+        with self._lock:
+            row = self._connection.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time(), key))
+            self._connection.commit()
+            return row[0]
+
+    def put(self, key: str, text: str) -> None:
+        """Stores the text for a key and evicts least recently used entries above the size limit."""
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            previous = self._connection.execute("SELECT size FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, text, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, text, size, time()),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        """Deletes the least recently used entries until the cache fits in max_bytes."""
+        while self._total_bytes > self.max_bytes:
+            rows = self._connection.execute(
+                "SELECT key, size FROM ocr_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                self._connection.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    return
+
+    @property
+    def stats(self) -> dict:
+        """Returns hit/miss counts and the current size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self._total_bytes,
+        }
+
+    def log_stats(self) -> None:
+        """Logs the cache statistics for this run."""
+        stats = self.stats
+        logging.info(
+            f"OCR cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate), {stats['bytes'] / 1024:.0f} KiB stored."
+        )
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+_cache: OCRCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> OCRCache:
+    """Returns the process-wide OCR cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OCRCache()
+        return _cache
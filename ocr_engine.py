@@ -0,0 +1,141 @@
+import logging
+import threading
+from functools import lru_cache
+from os import cpu_count
+from queue import Empty, Queue
+from typing import TYPE_CHECKING
+
+from ocr_cache import get_cache, page_fingerprint
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# pdf2image renders at 200 DPI unless told otherwise
+DEFAULT_DPI = 200
+
+
+@lru_cache(maxsize=1)
+def tesserocr_module():
+    """Returns the tesserocr module, or None if it is not installed.
+
+    tesserocr binds libtesseract directly, so a recognizer keeps its language model loaded between
+    pages and reads the image from memory. Without it we fall back to pytesseract's subprocess per page.
+    Both are imported on first use, pytesseract alone pulls in pandas when it is installed.
+    """
+    try:
+        import tesserocr
+    except ImportError:
+        logging.warning(
+            "OCR backend: pytesseract, one Tesseract process per page. Install tesserocr to keep recognizers loaded."
+        )
+        return None
+    logging.info(f"OCR backend: tesserocr {tesserocr.__version__} with pooled recognizers.")
+    return tesserocr
+
+
+class TesseractPool:
+    """A pool of long-lived Tesseract recognizers, one per OCR worker."""
+
+    def __init__(self, size: int = None, lang: str = "eng", tessdata_path: str = None) -> None:
+        """Initializes an empty pool; recognizers are created on first use up to ``size``."""
+        if tesserocr_module() is None:
+            raise RuntimeError("tesserocr is not installed, persistent recognizers are unavailable.")
+        self.size = size or cpu_count()
+        self.lang = lang
+        self.tessdata_path = tessdata_path
+        self._idle = Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        """Returns an idle recognizer, creating one if the pool has not reached its size yet."""
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                kwargs = {"lang": self.lang}
+                if self.tessdata_path:
+                    kwargs["path"] = self.tessdata_path
+                return tesserocr_module().PyTessBaseAPI(**kwargs)
+
+        # Every recognizer is busy, wait for one to be released
+        return self._idle.get()
+
+    def ocr_image(self, image: "Image.Image") -> str:
+        """Recognizes the text in an in-memory image using a pooled recognizer."""
+        api = self._acquire()
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            self._idle.put(api)
+
+    def close(self) -> None:
+        """Releases every idle recognizer and the language models they hold."""
+        while True:
+            try:
+                api = self._idle.get_nowait()
+            except Empty:
+                break
+            api.End()
+            with self._lock:
+                self._created -= 1
+
+
+_pools: dict[str, TesseractPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(lang: str = "eng", size: int = None) -> TesseractPool:
+    """Returns the shared recognizer pool for a language, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(lang)
+        if pool is None:
+            pool = _pools[lang] = TesseractPool(size=size, lang=lang)
+            logging.info(f"Created Tesseract recognizer pool for '{lang}' with up to {pool.size} engines.")
+        return pool
+
+
+def pytesseract_ocr(image: "Image.Image", lang: str = "eng") -> str:
+    """Recognizes an image through a fresh tesseract subprocess."""
+    import pytesseract
+
+    return pytesseract.image_to_string(image, lang=lang)
+
+
+@lru_cache(maxsize=1)
+def engine_version() -> str:
+    """Returns the Tesseract version string, which is part of every OCR cache key."""
+    if tesserocr_module() is not None:
+        return tesserocr_module().tesseract_version().splitlines()[0]
+    import pytesseract
+
+    return str(pytesseract.get_tesseract_version())
+
+
+def recognize(image: "Image.Image", lang: str = "eng") -> str:
+    """Performs OCR on an image with a pooled recognizer, or pytesseract when tesserocr is missing."""
+    if tesserocr_module() is None:
+        return pytesseract_ocr(image, lang=lang)
+    return get_pool(lang).ocr_image(image)
+
+
+def ocr_image(image: "Image.Image", lang: str = "eng", dpi: int = None, use_cache: bool = True) -> str:
+    """Returns the OCR text for an image, reusing the on-disk cache when the page was seen before."""
+    # Preprocessed pages carry the resolution they were rendered at
+    dpi = dpi or image.info.get("dpi", (DEFAULT_DPI,))[0]
+    if not use_cache:
+        return recognize(image, lang=lang)
+
+    cache = get_cache()
+    key = page_fingerprint(image, dpi, lang, engine_version())
+    text = cache.get(key)
+    if text is None:
+        text = recognize(image, lang=lang)
+        cache.put(key, text)
+    return text
@@ -0,0 +1,194 @@
+import logging
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+from time import monotonic, sleep
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 11434
+KEEP_ALIVE = "30m"  # How long the server keeps the model in memory after the last request
+NUM_CTX = 8192  # llama3's context window; Ollama defaults to 2048 and would truncate long prompts
+STARTUP_TIMEOUT = 30.0
+PROBE_TIMEOUT = 0.5
+
+
+class OllamaServer:
+    """Starts a local Ollama server if needed, waits for it to answer and keeps the model loaded.
+
+    Every request must send the same ``model_options()``: Ollama reloads the model whenever
+    ``num_ctx`` changes, which would throw away the warm-up.
+    """
+
+    def __init__(
+        self,
+        model: str = "llama3",
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        keep_alive: str = KEEP_ALIVE,
+        num_ctx: int = NUM_CTX,
+        executable: str = "ollama",
+    ) -> None:
+        """Initializes the manager; nothing is started until start() is called."""
+        self.model = model
+        self.host = host
+        self.port = port
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self.executable = executable
+        self.process: subprocess.Popen | None = None
+        self.cold_latency: float | None = None
+        self.warm_latency: float | None = None
+        self._warm_up_thread: threading.Thread | None = None
+        self._stderr = None
+
+    @property
+    def base_url(self) -> str:
+        """Returns the server's HTTP address."""
+        return f"http://{self.host}:{self.port}"
+
+    def model_options(self) -> dict:
+        """Returns the request options that keep the warmed-up model loaded."""
+        return {"keep_alive": self.keep_alive, "num_ctx": self.num_ctx}
+
+    def is_listening(self) -> bool:
+        """Returns True if something accepts TCP connections on the port."""
+        try:
+            with socket.create_connection((self.host, self.port), timeout=PROBE_TIMEOUT):
+                return True
+        except OSError:
+            return False
+
+    def is_ready(self) -> bool:
+        """Returns True if an Ollama server answers on the port."""
+        import httpx
+
+        if not self.is_listening():
+            return False
+        try:
+            return httpx.get(f"{self.base_url}/api/version", timeout=PROBE_TIMEOUT).status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def wait_until_ready(self, timeout: float = STARTUP_TIMEOUT) -> bool:
+        """Polls the server with exponential backoff until it answers or the timeout passes."""
+        deadline = monotonic() + timeout
+        delay = 0.05
+        while True:
+            if self.is_ready():
+                return True
+            if self.process is not None and self.process.poll() is not None:
+                return False
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return False
+            sleep(min(delay, remaining))
+            delay = min(delay * 2, 1.0)
+
+    def start(self, timeout: float = STARTUP_TIMEOUT) -> bool:
+        """Starts ``ollama serve`` unless a server is already running, and waits until it is ready."""
+        if self.is_ready():
+            logging.info(f"Ollama server already running at {self.base_url}.")
+            return True
+
+        # ollama serve takes its address from OLLAMA_HOST, it has no --port flag
+        env = {**os.environ, "OLLAMA_HOST": f"{self.host}:{self.port}"}
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self.process = subprocess.Popen(
+                [self.executable, "serve"], env=env, stdout=subprocess.DEVNULL, stderr=self._stderr
+            )
+        except OSError as error:
+            logging.error(f"Failed to start ollama serve: {error}")
+            return False
+
+        started = monotonic()
+        if self.wait_until_ready(timeout):
+            logging.info(f"ollama serve started at {self.base_url} in {monotonic() - started:.2f}s.")
+            return True
+
+        if self.process.poll() is None:
+            logging.error(f"ollama serve did not become ready within {timeout:.0f}s.")
+        else:
+            self._stderr.seek(0)
+            stderr = self._stderr.read().decode(errors="replace").strip()
+            logging.error(f"ollama serve exited with code {self.process.returncode}: {stderr}")
+        return False
+
+    def is_model_loaded(self) -> bool:
+        """Returns True if the model is already resident in the server's memory."""
+        import httpx
+
+        try:
+            response = httpx.get(f"{self.base_url}/api/ps", timeout=PROBE_TIMEOUT)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            return False
+        # Untagged model names refer to the ":latest" tag
+        names = {entry.get("name", "") for entry in response.json().get("models", [])}
+        return self.model in names or f"{self.model}:latest" in names
+
+    def _timed_generate(self, timeout: float) -> float:
+        """Sends an empty generate request, which only loads the model, and returns its latency."""
+        import httpx
+
+        started = monotonic()
+        response = httpx.post(
+            f"{self.base_url}/api/generate",
+            json={
+                "model": self.model,
+                "prompt": "",
+                "stream": False,
+                "keep_alive": self.keep_alive,
+                "options": {"num_ctx": self.num_ctx},
+            },
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        return monotonic() - started
+
+    def warm_up(self, timeout: float = 300.0) -> None:
+        """Loads the model and records the latency of a cold and a warm request."""
+        import httpx
+
+        try:
+            was_loaded = self.is_model_loaded()
+            latency = self._timed_generate(timeout)
+            if was_loaded:
+                self.warm_latency = latency
+                logging.info(f"{self.model} was already loaded, warm request {latency:.2f}s.")
+                return
+
+            self.cold_latency = latency
+            self.warm_latency = self._timed_generate(timeout)
+            logging.info(
+                f"{self.model} loaded: cold request {self.cold_latency:.2f}s, warm request {self.warm_latency:.2f}s."
+            )
+        except httpx.HTTPError as error:
+            logging.error(f"Failed to warm up {self.model}: {error}")
+
+    def warm_up_in_background(self) -> threading.Thread:
+        """Starts loading the model on a background thread, e.g. while OCR is still running."""
+        if self._warm_up_thread is None:
+            self._warm_up_thread = threading.Thread(target=self.warm_up, name="ollama-warm-up", daemon=True)
+            self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    def wait_for_warm_up(self) -> None:
+        """Blocks until a background warm-up has finished."""
+        if self._warm_up_thread is not None:
+            self._warm_up_thread.join()
+
+    def stop(self) -> None:
+        """Stops the server if this manager started it."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        if self._stderr is not None:
+            self._stderr.close()
+            self._stderr = None
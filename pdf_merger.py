@@ -1,17 +1,25 @@
 from os import path, listdir
 from pathlib import Path
-from PyPDF2 import PdfMerger
 from natsort import natsorted
-import sys
+import hashlib
+import json
+import os
+
+MANIFEST_SUFFIX = ".manifest.json"
+# Source files inserted between saves; the output is closed and reopened after each save so the pages
+# copied so far are released and memory stays bounded however many files are merged
+BATCH_SIZE = 25
 
 
 def merge_pdfs(folder_path: str, output_file: str, subject_code: str):
+    # Imported here so the subject prompt appears without waiting for the PDF library
+    from PyPDF2 import PdfMerger
     merger = PdfMerger()
 
     # Get a list of all PDF files in the folder
     folder_path = Path(folder_path)
     files_in_path = [
-        path.join(folder_path, file) 
+        path.join(folder_path, file)
         for file in listdir(folder_path)
         if file.endswith(".pdf") and file.startswith(subject_code)
     ]
@@ -38,12 +46,141 @@ def merge_pdfs(folder_path: str, output_file: str, subject_code: str):
     # sys.stderr = old_stderr
 
 
+def find_pdfs(folder_path: str, subject_code: str, exclude: str | None = None) -> list[Path]:
+    """Returns the subject's PDFs in natural sort order, leaving out the merged output itself."""
+    excluded = Path(exclude).resolve() if exclude else None
+    return natsorted(
+        (file for file in Path(folder_path).iterdir()
+         if file.name.endswith(".pdf") and file.name.startswith(subject_code) and file.resolve() != excluded),
+        key=lambda file: file.name,
+    )
+
+
+def file_sha256(file_path: Path) -> str:
+    """Hashes a file in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_state(file_path: Path) -> dict:
+    """Returns the size and modification time that tell whether a file may have changed."""
+    stat = file_path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_manifest(output_file: str) -> dict:
+    """Returns the manifest written with the merged output, or an empty one."""
+    try:
+        with open(output_file + MANIFEST_SUFFIX, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(output_file: str, manifest: dict) -> None:
+    """Replaces the manifest in one step, so an interrupted write never leaves half a manifest behind."""
+    temporary = output_file + MANIFEST_SUFFIX + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temporary, output_file + MANIFEST_SUFFIX)
+
+
+def describe_inputs(files: list[Path], previous: dict[str, dict]) -> list[dict]:
+    """Records each input's name, state and hash, reusing the manifest's hash for files that look unchanged."""
+    entries = []
+    for file in files:
+        state = file_state(file)
+        known = previous.get(file.name)
+        if known and all(known.get(key) == value for key, value in state.items()):
+            sha256 = known["sha256"]
+        else:
+            sha256 = file_sha256(file)
+        entries.append({"file": file.name, "sha256": sha256, **state})
+    return entries
+
+
+def merge_pdfs_incremental(folder_path: str, output_file: str, subject_code: str, batch_size: int = BATCH_SIZE):
+    """Brings the merged PDF up to date with the subject's PDFs, appending only new or changed inputs.
+
+    A manifest next to the output records each input's hash and the page it starts at. Inputs that match
+    the manifest from the start of the list are kept as they are; pages from the first new, changed or
+    removed input onwards are replaced. Every input gets a bookmark, with its own bookmarks nested below.
+    Returns (files appended, files kept).
+    """
+    import pymupdf
+
+    folder_path = Path(folder_path)
+    manifest = load_manifest(output_file)
+    output_exists = Path(output_file).exists()
+    # An output edited or replaced since the manifest was written cannot be trusted, so it is rebuilt
+    if output_exists and manifest.get("output") == file_state(Path(output_file)):
+        previous = manifest.get("files", [])
+    else:
+        previous = []
+
+    current = describe_inputs(find_pdfs(folder_path, subject_code, output_file), {e["file"]: e for e in previous})
+    kept = 0
+    while (kept < min(len(previous), len(current)) and previous[kept]["file"] == current[kept]["file"]
+           and previous[kept]["sha256"] == current[kept]["sha256"]):
+        current[kept].update(start_page=previous[kept]["start_page"], pages=previous[kept]["pages"])
+        kept += 1
+
+    if kept == len(previous) == len(current) and output_exists:
+        print(f"{output_file} is up to date ({kept} files).")
+        return 0, kept
+
+    kept_pages = current[kept - 1]["start_page"] + current[kept - 1]["pages"] if kept else 0
+    if kept:
+        document = pymupdf.open(output_file)
+        # Bookmarks into the kept pages survive; the rest are rebuilt with the pages they point to
+        toc = [entry for entry in document.get_toc(simple=True) if entry[2] <= kept_pages]
+        if document.page_count > kept_pages:
+            document.delete_pages(kept_pages, document.page_count - 1)
+    else:
+        document, toc = pymupdf.open(), []
+    # Deleting pages leaves unused objects behind that only a full save drops
+    needs_full_save = kept < len(previous) or not kept
+
+    def save(document):
+        nonlocal needs_full_save
+        if not needs_full_save and document.can_save_incrementally():
+            document.saveIncr()
+            document.close()
+        else:
+            temporary = output_file + ".tmp"
+            document.save(temporary, garbage=1 if kept else 0)
+            document.close()
+            os.replace(temporary, output_file)
+            needs_full_save = False
+        return pymupdf.open(output_file)
+
+    for index, entry in enumerate(current[kept:], 1):
+        print(folder_path / entry["file"])
+        with pymupdf.open(folder_path / entry["file"]) as source:
+            start_page = document.page_count
+            document.insert_pdf(source)
+            toc.append([1, Path(entry["file"]).stem, start_page + 1])
+            toc.extend([level + 1, title, page + start_page] for level, title, page in source.get_toc(simple=True))
+            entry.update(start_page=start_page, pages=source.page_count)
+        if index % batch_size == 0:
+            document = save(document)
+
+    document.set_toc(toc)
+    save(document).close()
+    save_manifest(output_file, {"output": file_state(Path(output_file)), "files": current})
+    return len(current) - kept, kept
+
+
 if __name__ == "__main__":
     m_folder_path = "pdf_merge/"
     subject_name = input("What subject are you merging?")
     m_output_file = f"{subject_name}-Merged_pdf.pdf"
     try:
-        merge_pdfs(m_folder_path, m_output_file, subject_name)
+        appended, reused = merge_pdfs_incremental(m_folder_path, m_output_file, subject_name)
+        print(f"Appended {appended} files, kept {reused} already merged.")
     except Exception as error:
         print(f"Error: {error}; Error type {error.__class__.__name__}")
     print("merged pdf been created.")
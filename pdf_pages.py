@@ -0,0 +1,296 @@
+import logging
+import threading
+from contextlib import nullcontext
+from os import cpu_count
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from queue import Queue
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Sentinel placed on the queues once a producer has nothing left to hand over
+_DONE = object()
+
+
+def page_count(pdf_file: Path) -> int:
+    """Returns the number of pages in a PDF without rendering any of them."""
+    from pdf2image import pdfinfo_from_path
+
+    return int(pdfinfo_from_path(pdf_file)["Pages"])
+
+
+def route_pages(pdf_file: Path, pages: Iterable[int], min_chars: int = 50) -> tuple[dict[int, str], list[int]]:
+    """Splits pages into those with a usable embedded text layer and those that need OCR.
+
+    A page keeps its embedded text when it has at least ``min_chars`` alphanumeric characters, or
+    when it has any text at all and no images that OCR could read more from. Returns the embedded
+    text by page number and the list of page numbers still to be rasterized and OCR'd.
+    """
+    import pymupdf
+
+    text_pages, ocr_pages = {}, []
+    with pymupdf.open(pdf_file) as document:
+        for page_number in pages:
+            page = document[page_number - 1]
+            text = page.get_text("text")
+            char_count = sum(char.isalnum() for char in text)
+            if char_count >= min_chars or (char_count and not page.get_images()):
+                text_pages[page_number] = text
+            else:
+                ocr_pages.append(page_number)
+
+    logging.info(
+        f"{pdf_file}: {len(text_pages)} pages from the text layer, {len(ocr_pages)} pages sent to OCR."
+    )
+    return text_pages, ocr_pages
+
+
+def page_windows(pages: Iterable[int], window_size: int) -> Iterator[list[int]]:
+    """Groups page numbers into runs of consecutive pages no longer than window_size."""
+    window = []
+    for page in pages:
+        if window and (page != window[-1] + 1 or len(window) >= window_size):
+            yield window
+            window = []
+        window.append(page)
+    if window:
+        yield window
+
+
+def iter_page_images(
+    pdf_file: Path,
+    pages: Iterable[int],
+    window_size: int = 4,
+    render_slots: threading.Semaphore = None,
+    **convert_kwargs,
+) -> Iterator[tuple[int, "Image.Image"]]:
+    """Renders the requested pages a small window at a time and yields (page_number, image) pairs.
+
+    ``render_slots`` is an optional semaphore held while each window renders, shared with other work.
+    """
+    from pdf2image import convert_from_path
+
+    for window in page_windows(pages, window_size):
+        with render_slots or nullcontext():
+            images = convert_from_path(pdf_file, first_page=window[0], last_page=window[-1], **convert_kwargs)
+        for page_number, image in zip(window, images):
+            yield page_number, image
+        # Drop the window list so only the images still held by consumers stay alive
+        del images
+
+
+def stream_ocr(
+    pdf_file: Path,
+    ocr_func: Callable[["Image.Image"], str],
+    max_workers: int,
+    pages: Iterable[int] = None,
+    window_size: int = None,
+    ocr_slots: threading.Semaphore = None,
+    preprocess: bool = False,
+    **convert_kwargs,
+) -> Iterator[tuple[int, str]]:
+    """Rasterizes a PDF in windows and OCRs the pages through a bounded queue.
+
+    Yields (page_number, text) pairs in completion order. At most ``max_workers`` images are
+    being recognized and at most ``max_workers`` more are waiting in the queue, so peak memory
+    depends on the worker count rather than on the number of pages in the document.
+
+    ``ocr_slots`` is an optional semaphore shared between documents. A slot is held only while one
+    window renders or one page is recognized, so several documents share one global worker budget for
+    both rendering and OCR without any of them holding the workers for long.
+
+    With ``preprocess`` set, every page is rendered at a DPI chosen from its text height, binarized and
+    cropped before OCR, and blank pages are reported as empty text without being recognized at all.
+    """
+    if pages is None:
+        pages = range(1, page_count(pdf_file) + 1)
+    window_size = window_size or max_workers
+
+    image_queue = Queue(maxsize=max_workers)
+    result_queue = Queue()
+    stop = threading.Event()
+
+    def produce() -> None:
+        # Renders pages and blocks whenever the workers fall behind
+        try:
+            if preprocess:
+                from image_preprocess import iter_preprocessed_pages
+
+                page_source = iter_preprocessed_pages(
+                    pdf_file,
+                    pages,
+                    window_size=window_size,
+                    max_workers=max_workers,
+                    render_slots=ocr_slots,
+                    **convert_kwargs,
+                )
+            else:
+                page_source = iter_page_images(pdf_file, pages, window_size, ocr_slots, **convert_kwargs)
+            for page_number, image in page_source:
+                if image is None:
+                    # Blank page, nothing to recognize
+                    result_queue.put((page_number, ""))
+                    continue
+                if stop.is_set():
+                    image.close()
+                    break
+                image_queue.put((page_number, image))
+        except Exception as error:
+            result_queue.put(error)
+        finally:
+            for _ in range(max_workers):
+                image_queue.put(_DONE)
+
+    def consume() -> None:
+        # Recognizes pages until the producer signals completion, freeing each image afterwards
+        while True:
+            item = image_queue.get()
+            if item is _DONE:
+                result_queue.put(_DONE)
+                return
+            page_number, image = item
+            try:
+                if not stop.is_set():
+                    with ocr_slots or nullcontext():
+                        text = ocr_func(image)
+                    result_queue.put((page_number, text))
+            except Exception as error:
+                logging.error(f"OCR failed on page {page_number}: {error}")
+                result_queue.put((page_number, ""))
+            finally:
+                image.close()
+                del image, item
+
+    with ThreadPoolExecutor(max_workers=max_workers + 1) as executor:
+        executor.submit(produce)
+        for _ in range(max_workers):
+            executor.submit(consume)
+
+        finished_workers = 0
+        try:
+            while finished_workers < max_workers:
+                result = result_queue.get()
+                if result is _DONE:
+                    finished_workers += 1
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    yield result
+        finally:
+            # Lets the producer stop early; workers keep draining the queue until they see _DONE
+            stop.set()
+
+
+class ReorderBuffer:
+    """Holds out-of-order page results and releases them once every earlier page has arrived."""
+
+    def __init__(self, pages: Iterable[int]) -> None:
+        """Initializes the buffer with the page numbers in the order they should be emitted."""
+        self._order = list(pages)
+        self._next = 0
+        self._pending: dict[int, str] = {}
+
+    def push(self, page_number: int, text: str) -> list[tuple[int, str]]:
+        """Adds a page result and returns the pages that now form a complete prefix, in order."""
+        self._pending[page_number] = text
+        ready = []
+        while self._next < len(self._order) and self._order[self._next] in self._pending:
+            current = self._order[self._next]
+            ready.append((current, self._pending.pop(current)))
+            self._next += 1
+        return ready
+
+    @property
+    def done(self) -> bool:
+        """Returns True once every expected page has been emitted."""
+        return self._next == len(self._order)
+
+
+def iter_pdf_text(
+    pdf_file: Path,
+    ocr_func: Callable[["Image.Image"], str],
+    max_workers: int,
+    pages: Iterable[int] = None,
+    window_size: int = None,
+    use_text_layer: bool = True,
+    output_path: Path = None,
+    ocr_slots: threading.Semaphore = None,
+    preprocess: bool = False,
+) -> Iterator[tuple[int, str]]:
+    """Yields (page_number, text) in page order as soon as each prefix of the document is complete.
+
+    Pages with a usable text layer are released immediately, the rest as OCR finishes them. When
+    ``output_path`` is given each page is also appended to that file the moment it is released, so
+    partial output survives and other readers can follow along.
+    """
+    pages = list(pages) if pages is not None else list(range(1, page_count(pdf_file) + 1))
+    if use_text_layer:
+        text_pages, ocr_pages = route_pages(pdf_file, pages)
+    else:
+        text_pages, ocr_pages = {}, pages
+
+    buffer = ReorderBuffer(pages)
+    output_file = open(output_path, "w", encoding="utf-8") if output_path else None
+
+    def release(ready: list[tuple[int, str]]) -> Iterator[tuple[int, str]]:
+        for page_number, text in ready:
+            if output_file:
+                output_file.write(text + "\n")
+                output_file.flush()
+            yield page_number, text
+
+    try:
+        for page_number, text in text_pages.items():
+            yield from release(buffer.push(page_number, text))
+        if ocr_pages:
+            for page_number, text in stream_ocr(
+                pdf_file,
+                ocr_func,
+                max_workers,
+                pages=ocr_pages,
+                window_size=window_size,
+                ocr_slots=ocr_slots,
+                preprocess=preprocess,
+            ):
+                yield from release(buffer.push(page_number, text))
+    finally:
+        if output_file:
+            output_file.close()
+
+
+def _extract_text_window(pdf_file: Path, pages: list[int]) -> list[tuple[int, str]]:
+    """Extracts the text layer of a run of pages in a worker process, with pymupdf when it is installed."""
+    try:
+        import pymupdf
+    except ImportError:
+        from pypdf import PdfReader
+
+        reader = PdfReader(pdf_file)
+        return [(page_number, reader.pages[page_number - 1].extract_text()) for page_number in pages]
+
+    with pymupdf.open(pdf_file) as document:
+        return [(page_number, document[page_number - 1].get_text("text")) for page_number in pages]
+
+
+def iter_text_layer(
+    pdf_file: Path, pages: Iterable[int], max_workers: int = None, window_size: int = None
+) -> Iterator[tuple[int, str]]:
+    """Yields (page_number, text) in page order, extracting the text layer across a process pool.
+
+    Pages are split into runs of consecutive pages so each worker opens the document once per run.
+    By default every worker gets about four runs, which keeps them evenly loaded when some pages
+    are much denser than others.
+    """
+    pages = list(pages)
+    max_workers = max_workers or cpu_count() or 1
+    window_size = window_size or max(1, -(-len(pages) // (max_workers * 4)))
+    buffer = ReorderBuffer(pages)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_extract_text_window, pdf_file, window) for window in page_windows(pages, window_size)
+        ]
+        for future in as_completed(futures):
+            for page_number, text in future.result():
+                yield from buffer.push(page_number, text)
@@ -1,16 +1,17 @@
+import asyncio
 import logging
 import os
-import subprocess
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from pyperclip import copy
 from time import sleep
 
-import httpx
-import ollama
-import psutil
-from pdf2image import convert_from_path
-from pytesseract import image_to_string
+import ocr_engine
+from llm_cache import get_cache as get_llm_cache
+from llm_client import LLMError, OllamaClient, stream_to_file
+from ocr_cache import get_cache
+from ollama_server import OllamaServer
+from pdf_pages import iter_pdf_text
+from text_chunker import chunk_stream, chunk_text, count_tokens, merge_groups
 
 
 class PDFProcessor:
@@ -20,8 +21,17 @@ class PDFProcessor:
         self.pdf_name = ""
         self.MAX_CONCURRENT_TASKS = os.cpu_count()
         self.RETRY_ATTEMPTS = 3
+        self.STREAM_PAGES = True  # Render pages in small windows instead of all at once
+        self.USE_TEXT_LAYER = True  # Skip OCR for pages that already have embedded text
+        self.PREPROCESS_PAGES = True  # Adaptive DPI, binarization and blank-page skipping before OCR
+        self.MAX_CHUNK_TOKENS = 3000  # Token budget per request, llama3 has an 8k context window
+        self.MAX_PARALLEL_REQUESTS = 2  # Limit on concurrent requests to the ollama server
+        self.STREAM_OUTPUT = True  # Append the final notes to the summary file token by token
         self.setup_logging()
+        ocr_engine.tesserocr_module()  # Logs which OCR backend the pages will go through
         self.port = 11434
+        self.server = OllamaServer(model='llama3', port=self.port)
+        self.llm = OllamaClient(base_url=self.server.base_url, max_retries=self.RETRY_ATTEMPTS, cache=get_llm_cache())
         self.start_ollama_serve()
 
     def setup_logging(self):
@@ -30,35 +40,34 @@ class PDFProcessor:
 
         logging.basicConfig(level=logging.INFO)
         logging.getLogger('pdf2image').setLevel(logging.WARNING)
+        logging.getLogger('httpx').setLevel(logging.WARNING)
 
-    def start_ollama_serve(self) -> bool | None:
-        def __is_port_in_use(port):
-            for conn in psutil.net_connections():
-                if conn.laddr.port == port:
-                    return True
-            return False
-
-        try:
-            if __is_port_in_use(self.port):
-                # logging.error(f"Port {self.port} is already in use.")
-                return
-
-            process = subprocess.Popen(["ollama", "serve", "--port", str(self.port)], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            sleep(1)  # Allow some time for the subprocess to start
-            if process.poll() is None:
-                logging.info("ollama serve started successfully.")
-            else:
-                stdout, stderr = process.communicate()
-                logging.error(f"Failed to start ollama serve: {stderr.decode()}")
-        except Exception as e:
-            logging.error(f"An unexpected error occurred while starting ollama serve: {e}")
+    def start_ollama_serve(self) -> bool:
+        # Probes the port over HTTP and only starts "ollama serve" when nothing answers
+        return self.server.start()
 
     @staticmethod
     def ocr_image(image) -> str:
-        return image_to_string(image, lang='eng')
+        return ocr_engine.ocr_image(image, lang='eng')
 
     def process_pdf(self, pdf_file: Path) -> str:
         try:
+            if self.STREAM_PAGES:
+                page_texts = [
+                    extracted_text + "\n"
+                    for _, extracted_text in iter_pdf_text(
+                        pdf_file,
+                        self.ocr_image,
+                        self.MAX_CONCURRENT_TASKS,
+                        use_text_layer=self.USE_TEXT_LAYER,
+                        preprocess=self.PREPROCESS_PAGES,
+                    )
+                ]
+                get_cache().log_stats()
+                return "".join(page_texts)
+
+            from pdf2image import convert_from_path
+
             images = convert_from_path(pdf_file)
             text = ""
 
@@ -83,30 +92,51 @@ class PDFProcessor:
             logging.error(f"An unexpected error occurred: {error}.")
 
     @staticmethod
-    def chunk_text(text: str, max_words: int) -> list[str]:
-        words = text.split()
-        chunks = []
-        current_chunk = []
-
-        for word in words:
-            if len(' '.join(current_chunk + [word])) <= max_words:
-                current_chunk.append(word)
-            else:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = [word]
+    def chunk_text(text: str, max_tokens: int, overlap: int = 0) -> list[str]:
+        return chunk_text(text, max_tokens, overlap)
 
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
+    def prompt_for_headings(self) -> list[str]:
+        user_headings = input(
+            "Please enter the headings that you want the notes to be created under separated by a comma: "
+        ).split(",")
+        headings_list = [heading.strip() for heading in user_headings]
+        print(headings_list)
+        return headings_list
 
-        return chunks
+    async def request_notes(self, system_prompt: str, content: str, label: str = "Total") -> str:
+        try:
+            response = await self.llm.chat(
+                model='llama3',
+                messages=[
+                    dict(role='system', content=system_prompt),
+                    dict(role='user', content=content)
+                ],
+                **self.server.model_options()
+            )
+        except LLMError as e:
+            logging.error(f"Error in generating notes: {e}")
+            raise ValueError("Error in generating notes") from e
+        logging.info(f"{label} tokens used: {response.total_tokens}{' (cached)' if response.cached else ''}")
+        return response.content
+
+    async def stream_notes(self, system_prompt: str, content: str, label: str = "Total") -> str:
+        # Appends the notes to the summary file as they are generated, a broken stream keeps what arrived
+        return await stream_to_file(
+            self.llm,
+            self.SUMMARY_FILE_PATH,
+            model='llama3',
+            messages=[
+                dict(role='system', content=system_prompt),
+                dict(role='user', content=content)
+            ],
+            mode='a',
+            label=label,
+            **self.server.model_options()
+        )
 
     def generate_notes(self, facts: str) -> str:
         try:
-            user_headings = input(
-                "Please enter the headings that you want the notes to be created under separated by a comma: "
-            ).split(",")
-            headings_list = [heading.strip() for heading in user_headings]
-            print(headings_list)
+            headings_list = self.prompt_for_headings()
             gpt_input = (
                 "You are a note-taking assistant. Create comprehensive notes that thoroughly explain all the "
                 "content taught from the lecture slides under each heading using the headings given here: "
@@ -115,50 +145,123 @@ class PDFProcessor:
                 "where necessary. Ensure the notes cover all the material presented in the lecture and are clear and "
                 "easy to understand. Respond only in markdown format."
             )
+            final_request = self.stream_notes if self.STREAM_OUTPUT else self.request_notes
+            notes = self.llm.run(final_request(gpt_input, f'Lecture slides: {facts}'))
+            logging.info(notes)
+            return notes
+
+        except Exception as e:
+            logging.error(f"An unexpected error occurred: {e}")
+            raise ValueError("Error in generating notes")
 
-            for attempt in range(1, self.RETRY_ATTEMPTS + 1):
-                try:
-                    with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_TASKS) as executor:
-                        future = executor.submit(
-                            ollama.chat,
-                            model='llama3',
-                            messages=[
-                                dict(role='system', content=gpt_input),
-                                dict(role='user', content=f'Lecture slides: {facts}')
-                            ]
-                        )
-                    response = future.result(timeout=60)  # Add a timeout
-                    logging.info(response["message"]["content"])
-                    return response['message']['content']
-                except httpx.ConnectError as ce:
-                    logging.error(f"Connection error (attempt {attempt}/{self.RETRY_ATTEMPTS}): {ce}")
-                    if attempt < self.RETRY_ATTEMPTS:
-                        logging.info("Retrying in 5 seconds...")
-                        sleep(5)
-                    else:
-                        raise ValueError("Failed to connect after retrying") from ce
-                except TimeoutError:
-                    logging.error(f"Ollama chat task timed out on attempt {attempt}.")
-                except Exception as e:
-                    logging.error(f"Error in generating notes: {e}")
-                    raise ValueError("Error in generating notes")
+    def generate_notes_map_reduce(self, facts: str) -> str:
+        # Notes each token-budgeted chunk concurrently, then merges the section notes in a reduce pass
+        try:
+            headings_list = self.prompt_for_headings()
+            map_prompt = (
+                "You are a note-taking assistant. You will receive one consecutive part of a lecture. Create "
+                f"comprehensive notes for it under the headings given here where they apply: {headings_list}. "
+                "Include detailed explanations, code examples, formulas, and diagrams where necessary. "
+                "Respond only in markdown format."
+            )
+            reduce_prompt = (
+                "You are a note-taking assistant. You will receive notes written for consecutive parts of the same "
+                f"lecture. Merge them into one markdown document under the headings {headings_list}. Remove "
+                "repetition between parts, keep every explanation, example and formula, and keep the order in which "
+                "topics were taught. Respond only in markdown format."
+            )
+
+            notes = self.llm.run(self.map_reduce_notes(facts, map_prompt, reduce_prompt))
+            logging.info(notes)
+            return notes
 
         except Exception as e:
             logging.error(f"An unexpected error occurred: {e}")
             raise ValueError("Error in generating notes")
 
+    async def map_reduce_notes(self, facts: str, map_prompt: str, reduce_prompt: str) -> str:
+        semaphore = asyncio.Semaphore(self.MAX_PARALLEL_REQUESTS)
+
+        async def limited(system_prompt, content, label):
+            async with semaphore:
+                return await self.request_notes(system_prompt, content, label)
+
+        section_notes = await asyncio.gather(*(
+            limited(map_prompt, f'Lecture slides: {chunk}', f"Chunk {index}")
+            for index, chunk in enumerate(chunk_stream([facts], self.MAX_CHUNK_TOKENS), 1)
+        ))
+
+        condense_prompt = (
+            "You are a note-taking assistant. You will receive the notes for one part of a lecture, too long to be "
+            "merged with the notes for the neighbouring parts. Rewrite them at about half the length, keeping every "
+            "topic, formula and code example and dropping only repetition and filler. Respond only in markdown format."
+        )
+
+        # Merge in rounds until the section notes fit into a single request
+        round_number, condensed = 1, False
+        while len(section_notes) > 1:
+            groups = merge_groups(section_notes, self.MAX_CHUNK_TOKENS)
+
+            if len(groups) == len(section_notes):
+                # No two neighbouring notes fit into one request, so each is condensed once before merging again
+                if condensed:
+                    logging.warning("Section notes are still too long to merge after condensing; joining them as is")
+                    section_notes = ["\n\n".join(section_notes)]
+                    break
+                logging.info(f"Condensing {len(section_notes)} section notes that are too long to merge")
+                section_notes = await asyncio.gather(*(
+                    limited(condense_prompt, notes, f"Condense round {round_number} notes {index}")
+                    for index, notes in enumerate(section_notes, 1)
+                ))
+                condensed = True
+                round_number += 1
+                continue
+            condensed = False
+
+            if len(groups) == 1 and self.STREAM_OUTPUT:
+                # The last merge produces the final notes, stream them into the summary file
+                async with semaphore:
+                    return await self.stream_notes(
+                        reduce_prompt, "\n\n---\n\n".join(groups[0]), f"Reduce round {round_number}"
+                    )
+
+            # At least one group holds two notes, so every round leaves fewer notes; a group of one is carried over
+            section_notes = await asyncio.gather(*(
+                limited(reduce_prompt, "\n\n---\n\n".join(group), f"Reduce round {round_number} group {index}")
+                if len(group) > 1 else asyncio.sleep(0, group[0])
+                for index, group in enumerate(groups, 1)
+            ))
+            round_number += 1
+
+        notes = section_notes[0] if section_notes else ""
+        if self.STREAM_OUTPUT:
+            with open(self.SUMMARY_FILE_PATH, mode='a', encoding='utf-8') as file:
+                file.write(notes)
+        return notes
+
     def process_pdf_files(self):
         try:
             self.pdf_name = self.prompt_user_for_pdf_name()
             pdf_path: Path = self.PDF_DIRECTORY / self.pdf_name
 
+            # Load the model while the pages are being OCR'd so the first request does not pay for it
+            self.server.warm_up_in_background()
             ocr_text = self.process_pdf(pdf_path)
-            notes = self.generate_notes(ocr_text)
+            self.server.wait_for_warm_up()
+            # Fall back to map-reduce when the text would not fit in the model context
+            if count_tokens(ocr_text) > self.MAX_CHUNK_TOKENS:
+                notes = self.generate_notes_map_reduce(ocr_text)
+            else:
+                notes = self.generate_notes(ocr_text)
 
-            with open(self.SUMMARY_FILE_PATH, mode='a', encoding='utf-8') as file:
-                file.write(notes)
+            if not self.STREAM_OUTPUT:
+                with open(self.SUMMARY_FILE_PATH, mode='a', encoding='utf-8') as file:
+                    file.write(notes)
+
+            from pyperclip import copy
 
             copy(notes)
+            get_llm_cache().log_stats()
 
         except KeyboardInterrupt:
             logging.info("\nExiting program due to user interruption.")
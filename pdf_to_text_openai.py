@@ -1,13 +1,22 @@
+import argparse
+import asyncio
 import logging
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from os import cpu_count, getenv
+from time import perf_counter
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Iterable, Iterator, List
 
-import pytesseract
-from openai import OpenAI, OpenAIError
-from pdf2image import convert_from_path
-from PIL import Image
+import ocr_engine
+from llm_cache import get_cache as get_llm_cache
+from llm_client import LLMError, OpenAIClient, stream_to_file
+from ocr_cache import get_cache
+from pdf_pages import iter_pdf_text, page_count
+from text_chunker import chunk_stream, merge_groups
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 
 # Class responsible for setting up logging for the application
@@ -21,6 +30,7 @@ class LoggerSetup:
         logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
         logging.getLogger("pdf2image").setLevel(logging.WARNING)
         logging.getLogger("openai").setLevel(logging.WARNING)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
 
     @staticmethod
     def log_error(message: str) -> None:
@@ -35,37 +45,72 @@ class LoggerSetup:
 
 # Class that processes Optical Character Recognition (OCR) from images in PDFs
 class OCRProcessor:
-    def __init__(self, max_concurrent_tasks: int = None) -> None:
+    def __init__(
+        self,
+        max_concurrent_tasks: int = None,
+        stream_pages: bool = True,
+        window_size: int = None,
+        use_text_layer: bool = True,
+        ocr_slots: threading.Semaphore = None,
+        preprocess: bool = True,
+    ) -> None:
         """Initializes the OCRProcessor with a specified number of concurrent tasks."""
         # Sets max concurrent tasks based on available CPU cores if not provided
         self.max_concurrent_tasks = max_concurrent_tasks or cpu_count()
+        # Streaming renders a few pages at a time instead of the whole document up front
+        self.stream_pages = stream_pages
+        self.window_size = window_size or self.max_concurrent_tasks
+        # Born-digital pages keep their embedded text and skip rasterization entirely
+        self.use_text_layer = use_text_layer
+        # Optional OCR worker budget shared with other documents processed at the same time
+        self.ocr_slots = ocr_slots
+        # Adaptive DPI, binarization, margin cropping and blank-page skipping before OCR
+        self.preprocess = preprocess
         self.logger_setup = LoggerSetup()
+        ocr_engine.tesserocr_module()  # Logs which OCR backend the pages will go through
 
     @staticmethod
-    def ocr_image(image: Image.Image) -> str:
+    def ocr_image(image: "Image.Image") -> str:
         """Performs OCR (Optical Character Recognition) on the given image."""
-        # Converts the image to text using pytesseract (OCR library)
-        return pytesseract.image_to_string(image, lang="eng")
+        # Converts the image to text using a pooled Tesseract recognizer
+        return ocr_engine.ocr_image(image, lang="eng")
+
+    @staticmethod
+    def prompt_for_page_range() -> dict:
+        """Asks the user for an optional page range and returns it as conversion parameters."""
+        page_range = input(
+            "Enter page range to process (e.g., 2-5) or press Enter to process the entire PDF: "
+        ).strip()
+        return OCRProcessor.parse_page_range(page_range)
+
+    @staticmethod
+    def parse_page_range(page_range: str) -> dict:
+        """Parses a range such as '2-5' into first_page/last_page conversion parameters."""
+        convert_kwargs = {}
+
+        if page_range:
+            # Parse the range and adjust the conversion parameters for specific pages
+            try:
+                start_str, end_str = page_range.split("-")
+                convert_kwargs["first_page"] = int(start_str)
+                convert_kwargs["last_page"] = int(end_str)
+            except Exception as error:
+                LoggerSetup.log_error(f"Invalid range entered ({error}). Processing entire PDF.")
+
+        return convert_kwargs
 
     def process_pdf(self, pdf_file: Path) -> str:
         """Processes OCR and generates text from a PDF file."""
         try:
             # Ask the user for an optional page range
-            page_range = input(
-                "Enter page range to process (e.g., 2-5) or press Enter to process the entire PDF: "
-            ).strip()
-            convert_kwargs = {}
+            convert_kwargs = self.prompt_for_page_range()
 
-            if page_range:
-                # Parse the range and adjust the conversion parameters for specific pages
-                try:
-                    start_str, end_str = page_range.split("-")
-                    convert_kwargs["first_page"] = int(start_str)
-                    convert_kwargs["last_page"] = int(end_str)
-                except Exception as error:
-                    LoggerSetup.log_error(f"Invalid range entered ({error}). Processing entire PDF.")
+            if self.stream_pages:
+                return self.stream_pdf(pdf_file, **convert_kwargs)
 
             # Convert PDF to images
+            from pdf2image import convert_from_path
+
             images = convert_from_path(pdf_file, **convert_kwargs)
             text = ""
 
@@ -87,14 +132,213 @@ class OCRProcessor:
             LoggerSetup.log_error(f"An unexpected error occurred: {error}.")
         return ""
 
+    def stream_pdf(self, pdf_file: Path, first_page: int = None, last_page: int = None) -> str:
+        """OCRs a PDF window by window so only a bounded number of page images is held in memory."""
+        return "".join(text + "\n" for text in self.iter_pages(pdf_file, first_page, last_page))
+
+    def iter_pages(
+        self, pdf_file: Path, first_page: int = None, last_page: int = None, output_path: Path = None
+    ) -> Iterator[str]:
+        """Yields page texts in page order as soon as every earlier page is done."""
+        first_page = first_page or 1
+        last_page = last_page or page_count(pdf_file)
+
+        for _, text in iter_pdf_text(
+            pdf_file,
+            self.ocr_image,
+            self.max_concurrent_tasks,
+            pages=range(first_page, last_page + 1),
+            window_size=self.window_size,
+            use_text_layer=self.use_text_layer,
+            output_path=output_path,
+            ocr_slots=self.ocr_slots,
+            preprocess=self.preprocess,
+        ):
+            yield text
+        get_cache().log_stats()
+
 
 # Class for processing and interacting with the OpenAI API to generate notes
 class TextProcessor:
+    MAX_CHUNK_TOKENS = 8000  # Token budget for each lecture chunk in the map pass
+    MAX_REDUCE_TOKENS = 24000  # Token budget for the section notes merged by one reduce request
+    MAX_PARALLEL_REQUESTS = 4  # Limit on concurrent requests to the model
+
     def __init__(self) -> None:
         """Initializes the TextProcessor."""
 
     @staticmethod
-    def generate_notes(client: OpenAI, facts: str) -> str:
+    def prompt_for_headings() -> List[str]:
+        """Asks the user for the headings the notes should be organised under."""
+        user_headings = input(
+            "Please enter the headings that you want the notes to be created under separated by a comma: "
+        ).split(",")
+        return [heading.strip() for heading in user_headings if heading.strip()]
+
+    @staticmethod
+    async def request_notes(client: OpenAIClient, system_prompt: str, content: str, label: str = "Total") -> str:
+        """Sends one notes request to the model and logs its token usage."""
+        try:
+            response = await client.chat(
+                model="gpt-4o-mini",
+                temperature=0.6,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": content},
+                ],
+            )
+            cached = " (cached)" if response.cached else ""
+            LoggerSetup.log_info(f"{label} tokens used: {response.total_tokens}{cached}")
+            return response.content
+        except LLMError as error:
+            LoggerSetup.log_error(f"OpenAI error: {error}")
+            return "Error generating notes"
+
+    @staticmethod
+    async def stream_notes(
+        client: OpenAIClient, system_prompt: str, content: str, output_path: Path, label: str = "Total"
+    ) -> str:
+        """Streams the model's notes into a file as they are generated, keeping partial output on errors."""
+        return await stream_to_file(
+            client,
+            output_path,
+            model="gpt-4o-mini",
+            temperature=0.6,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content},
+            ],
+            label=label,
+        )
+
+    def generate_notes_map_reduce(
+        self,
+        client: OpenAIClient,
+        pages: Iterable[str],
+        headings_list: List[str],
+        max_chunk_tokens: int = None,
+        max_parallel: int = None,
+        output_path: Path = None,
+    ) -> str:
+        """Generates notes for documents larger than the model context.
+
+        The map pass groups the incoming pages into token-budgeted chunks and generates section notes
+        for each chunk as soon as it is complete, with at most ``max_parallel`` requests in flight, so
+        it can run while later pages are still being OCR'd. The reduce pass merges the section notes.
+        With ``output_path`` set, the final request is streamed into that file as it is generated.
+        """
+        return client.run(
+            self.map_reduce_notes(client, pages, headings_list, max_chunk_tokens, max_parallel, output_path)
+        )
+
+    async def map_reduce_notes(
+        self,
+        client: OpenAIClient,
+        pages: Iterable[str],
+        headings_list: List[str],
+        max_chunk_tokens: int = None,
+        max_parallel: int = None,
+        output_path: Path = None,
+    ) -> str:
+        """Runs the map and reduce passes of generate_notes_map_reduce on the running event loop."""
+        max_chunk_tokens = max_chunk_tokens or self.MAX_CHUNK_TOKENS
+        semaphore = asyncio.Semaphore(max_parallel or self.MAX_PARALLEL_REQUESTS)
+        map_prompt = (
+            "You are a note-taking assistant. You will receive one consecutive part of a lecture. Create "
+            f"detailed notes for it under the following main headings where they apply: {headings_list}. "
+            "Generate subheadings where appropriate, provide thorough explanations, examples, code snippets, "
+            "formulas, and diagrams as needed. Present the notes in markdown format."
+        )
+
+        async def limited(system_prompt: str, content: str, label: str) -> str:
+            async with semaphore:
+                return await self.request_notes(client, system_prompt, content, label)
+
+        # Pages come from a blocking OCR generator, so pull chunks from it on a worker thread
+        chunks = chunk_stream(pages, max_chunk_tokens)
+        tasks = []
+        held_chunk = None
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            if output_path is not None and not tasks and held_chunk is None:
+                # Hold the first chunk until we know whether it is the only one; if it is, its notes are
+                # the final output and can be streamed straight into the summary file
+                held_chunk = chunk
+                continue
+            for content in (held_chunk, chunk) if held_chunk is not None else (chunk,):
+                # Start each chunk as soon as it is full, OCR keeps going in the background
+                label = f"Chunk {len(tasks) + 1}"
+                tasks.append(asyncio.create_task(limited(map_prompt, f"Lecture slides: {content}", label)))
+            held_chunk = None
+
+        if held_chunk is not None:
+            async with semaphore:
+                return await self.stream_notes(client, map_prompt, f"Lecture slides: {held_chunk}", output_path)
+        section_notes = list(await asyncio.gather(*tasks))
+
+        reduce_prompt = (
+            "You are a note-taking assistant. You will receive notes written for consecutive parts of the same "
+            f"lecture. Merge them into one well-structured markdown document under the main headings {headings_list}. "
+            "Remove repetition between parts, keep every explanation, example, code snippet and formula, and keep "
+            "the order in which topics were taught."
+        )
+
+        condense_prompt = (
+            "You are a note-taking assistant. You will receive the notes for one part of a lecture, too long to be "
+            "merged with the notes for the neighbouring parts. Rewrite them in markdown at about half the length, "
+            "keeping every topic, formula and code snippet and dropping only repetition and filler."
+        )
+
+        round_number, condensed = 1, False
+        while len(section_notes) > 1:
+            # Group consecutive section notes so each merge request stays within the token budget
+            groups = merge_groups(section_notes, self.MAX_REDUCE_TOKENS)
+
+            if len(groups) == len(section_notes):
+                # No two neighbouring notes fit into one request, so each is condensed once before merging again
+                if condensed:
+                    logging.warning("Section notes are still too long to merge after condensing; joining them as is")
+                    section_notes = ["\n\n".join(section_notes)]
+                    break
+                logging.info(f"Condensing {len(section_notes)} section notes that are too long to merge")
+                section_notes = list(
+                    await asyncio.gather(
+                        *(
+                            limited(condense_prompt, notes, f"Condense round {round_number} notes {index}")
+                            for index, notes in enumerate(section_notes, 1)
+                        )
+                    )
+                )
+                condensed = True
+                round_number += 1
+                continue
+            condensed = False
+
+            if len(groups) == 1 and output_path is not None:
+                # The last merge produces the final notes, stream them into the summary file
+                async with semaphore:
+                    return await self.stream_notes(
+                        client, reduce_prompt, "\n\n---\n\n".join(groups[0]), output_path,
+                        f"Reduce round {round_number}",
+                    )
+
+            # At least one group holds two notes, so every round leaves fewer notes; a group of one is carried over
+            section_notes = list(
+                await asyncio.gather(
+                    *(
+                        limited(reduce_prompt, "\n\n---\n\n".join(group), f"Reduce round {round_number} group {index}")
+                        if len(group) > 1 else asyncio.sleep(0, group[0])
+                        for index, group in enumerate(groups, 1)
+                    )
+                )
+            )
+            round_number += 1
+
+        notes = section_notes[0] if section_notes else ""
+        if output_path is not None:
+            Path(output_path).write_text(notes, encoding="utf-8")
+        return notes
+
+    def generate_notes(self, client: OpenAIClient, facts: str, output_path: Path = None) -> str:
         """Generates notes by interacting with a chat-based language model."""
         # Prompt user to input headings for the notes generation
         user_headings = input(
@@ -114,25 +358,9 @@ class TextProcessor:
             "elaborates on the topics mentioned in the lecture. Present the notes in markdown format."
         )
 
-        try:
-            # Use ThreadPoolExecutor to make an API call concurrently
-            with ThreadPoolExecutor() as executor:
-                # Submit the GPT model request
-                future = executor.submit(
-                    client.chat.completions.create,
-                    model="gpt-4o-mini",
-                    temperature=0.6,
-                    messages=[
-                        {"role": "system", "content": gpt_input},
-                        {"role": "user", "content": f"Lecture slides: {facts}"},
-                    ],
-                )
-                response = future.result()
-            LoggerSetup.log_info(f"Total tokens used: {response.usage.total_tokens}")
-            return response.choices[0].message.content
-        except OpenAIError as error:
-            LoggerSetup.log_error(f"OpenAI error: {error}")
-            return "Error generating notes"
+        if output_path is not None:
+            return client.run(self.stream_notes(client, gpt_input, f"Lecture slides: {facts}", output_path))
+        return client.run(self.request_notes(client, gpt_input, f"Lecture slides: {facts}"))
 
 
 # Main class that manages the entire PDF processing and notes generation
@@ -142,6 +370,11 @@ class PDFProcessor:
     SUMMARY_DIRECTORY = Path("summary")
     MAX_CONCURRENT_TASKS = cpu_count()  # Limit concurrent tasks to avoid overwhelming resources
     RETRY_ATTEMPTS = 3  # Number of retry attempts for API rate limiting
+    REQUESTS_PER_MINUTE = 500  # OpenAI rate limits for the account tier
+    TOKENS_PER_MINUTE = 200000
+    MAX_DOCUMENTS = 4  # Documents processed at the same time in batch mode
+    STREAM_OUTPUT = True  # Write the final notes into the summary file token by token
+    INCREMENTAL_NOTES = True  # Map-reduce notes generation that starts while later pages are still being OCR'd
 
     def __init__(self) -> None:
         """Initializes the PDFProcessor."""
@@ -151,6 +384,97 @@ class PDFProcessor:
         """Lists all PDF files in the 'pdf' directory."""
         return [file for file in self.PDF_DIRECTORY.glob("*.pdf")]
 
+    def create_client(self) -> OpenAIClient:
+        """Creates the OpenAI client shared by every request of a run."""
+        return OpenAIClient(
+            api_key=getenv("OPENAI_API_KEY"),
+            requests_per_minute=self.REQUESTS_PER_MINUTE,
+            tokens_per_minute=self.TOKENS_PER_MINUTE,
+            max_retries=self.RETRY_ATTEMPTS,
+            cache=get_llm_cache(),
+        )
+
+    def process_batch(
+        self,
+        pdf_files: List[Path],
+        headings_list: List[str],
+        page_range: dict = None,
+        ocr_workers: int = None,
+        max_documents: int = None,
+    ) -> None:
+        """Processes many PDFs unattended and writes one summary per file.
+
+        Every document renders and OCRs its pages through one shared OCRProcessor whose workers draw from a
+        global budget of ``ocr_workers`` slots, held for one render or one page at a time, so no document
+        keeps the workers for long. Up to ``max_documents`` documents run at once and their LLM requests
+        share one client and event loop.
+        """
+        self.SUMMARY_DIRECTORY.mkdir(parents=True, exist_ok=True)
+        ocr_slots = threading.Semaphore(ocr_workers or self.MAX_CONCURRENT_TASKS)
+        client = self.create_client()
+        start = perf_counter()
+
+        results = client.run(
+            self.process_batch_async(
+                client, pdf_files, headings_list, page_range or {}, ocr_slots, max_documents or self.MAX_DOCUMENTS
+            )
+        )
+
+        elapsed = perf_counter() - start
+        total_pages = sum(pages for _, pages, _, _ in results)
+        failures = [pdf_file for pdf_file, _, _, ok in results if not ok]
+        LoggerSetup.log_info("Batch throughput report:")
+        for pdf_file, pages, seconds, ok in results:
+            status = "ok" if ok else "FAILED"
+            LoggerSetup.log_info(f"  {pdf_file.name}: {pages} pages in {seconds:.1f}s [{status}]")
+        LoggerSetup.log_info(
+            f"Processed {len(results) - len(failures)}/{len(results)} documents, {total_pages} pages in "
+            f"{elapsed:.1f}s ({total_pages / elapsed if elapsed else 0:.2f} pages/s, "
+            f"{len(results) / elapsed * 60 if elapsed else 0:.1f} documents/min)."
+        )
+        get_llm_cache().log_stats()
+
+    async def process_batch_async(
+        self,
+        client: OpenAIClient,
+        pdf_files: List[Path],
+        headings_list: List[str],
+        page_range: dict,
+        ocr_slots: threading.Semaphore,
+        max_documents: int,
+    ) -> List[tuple]:
+        """Runs every document's OCR and notes pipeline concurrently on one event loop."""
+        document_slots = asyncio.Semaphore(max_documents)
+        # One processor for the whole batch; its render and OCR work is bounded by the shared slots
+        ocr_processor = OCRProcessor(self.MAX_CONCURRENT_TASKS, ocr_slots=ocr_slots)
+
+        async def process_document(pdf_file: Path) -> tuple:
+            async with document_slots:
+                start = perf_counter()
+                page_counter = [0]
+
+                def counted(pages: Iterable[str]) -> Iterator[str]:
+                    for page in pages:
+                        page_counter[0] += 1
+                        yield page
+
+                try:
+                    pages = ocr_processor.iter_pages(
+                        pdf_file, output_path=self.SUMMARY_DIRECTORY / f"{pdf_file.stem}_ocr.txt", **page_range
+                    )
+                    summary_file = self.SUMMARY_DIRECTORY / f"{pdf_file.stem}_summary.md"
+                    await TextProcessor().map_reduce_notes(
+                        client, counted(pages), headings_list, output_path=summary_file
+                    )
+                    LoggerSetup.log_info(f"Summary written to: {summary_file}")
+                    ok = True
+                except Exception as error:
+                    LoggerSetup.log_error(f"Error processing PDF {pdf_file}: {error}.")
+                    ok = False
+                return pdf_file, page_counter[0], perf_counter() - start, ok
+
+        return list(await asyncio.gather(*(process_document(pdf_file) for pdf_file in pdf_files)))
+
     def process_pdf_files(self) -> None:
         """Processes PDF files by OCR and generates summaries."""
         try:
@@ -167,18 +491,35 @@ class PDFProcessor:
             selected_pdf = self.prompt_user_for_pdf_selection(pdf_files)
             try:
                 # Process selected PDF file
-                client = OpenAI(api_key=getenv("OPENAI_API_KEY"))
+                summary_file = self.SUMMARY_DIRECTORY / f"{selected_pdf.stem}_summary.md"
+                output_path = summary_file if self.STREAM_OUTPUT else None
+                client = self.create_client()
                 ocr_processor = OCRProcessor(self.MAX_CONCURRENT_TASKS)
-                text = ocr_processor.process_pdf(selected_pdf)
-
-                # Generate notes based on the extracted text
                 text_processor = TextProcessor()
-                notes = text_processor.generate_notes(client=client, facts=text)
 
-                # Write the generated notes to a summary file
-                summary_file = self.SUMMARY_DIRECTORY / f"{selected_pdf.stem}_summary.md"
-                summary_file.write_text(notes, encoding="utf-8")
+                if self.INCREMENTAL_NOTES:
+                    # Collect all input up front so OCR and generation can overlap without prompts
+                    page_range = ocr_processor.prompt_for_page_range()
+                    headings_list = text_processor.prompt_for_headings()
+                    pages = ocr_processor.iter_pages(
+                        selected_pdf,
+                        output_path=self.SUMMARY_DIRECTORY / f"{selected_pdf.stem}_ocr.txt",
+                        **page_range,
+                    )
+                    notes = text_processor.generate_notes_map_reduce(
+                        client, pages, headings_list, output_path=output_path
+                    )
+                else:
+                    text = ocr_processor.process_pdf(selected_pdf)
+
+                    # Generate notes based on the extracted text
+                    notes = text_processor.generate_notes(client=client, facts=text, output_path=output_path)
+
+                # Write the generated notes to a summary file, unless they were streamed into it
+                if output_path is None:
+                    summary_file.write_text(notes, encoding="utf-8")
                 LoggerSetup.log_info(f"Summary written to: {summary_file}")
+                get_llm_cache().log_stats()
 
             except Exception as inner_error:
                 LoggerSetup.log_error(f"Error processing PDF {selected_pdf}: {inner_error}.")
@@ -204,10 +545,41 @@ class PDFProcessor:
                 LoggerSetup.log_error(f"Invalid selection. Please enter a number between 1 and {len(pdf_files)}.")
 
 
+def parse_args() -> argparse.Namespace:
+    """Parses the command line; without --batch the program runs interactively."""
+    parser = argparse.ArgumentParser(description="OCR lecture PDFs and generate markdown notes.")
+    parser.add_argument("--batch", action="store_true", help="Process every matching PDF without prompting")
+    parser.add_argument("--glob", default="*.pdf", help="Pattern of PDFs to process inside the pdf directory")
+    parser.add_argument("--pages", default="", help="Page range to process in every PDF, e.g. 2-5")
+    parser.add_argument("--headings", default="", help="Comma separated headings for the notes")
+    parser.add_argument("--ocr-workers", type=int, default=None, help="Global OCR worker budget")
+    parser.add_argument("--max-documents", type=int, default=None, help="Documents processed at the same time")
+    parser.add_argument(
+        "--fresh-samples", action="store_true", help="Skip the LLM cache for requests sampled above temperature 0"
+    )
+    return parser.parse_args()
+
+
 # Main program execution
 if __name__ == "__main__":
     try:
+        args = parse_args()
+        if args.fresh_samples:
+            get_llm_cache(skip_sampled=True)
         processor = PDFProcessor()
-        processor.process_pdf_files()
+        if args.batch:
+            batch_files = sorted(processor.PDF_DIRECTORY.glob(args.glob))
+            if not batch_files:
+                LoggerSetup.log_error(f"No PDF files matching '{args.glob}' in the 'pdf' directory.")
+            else:
+                processor.process_batch(
+                    batch_files,
+                    [heading.strip() for heading in args.headings.split(",") if heading.strip()],
+                    page_range=OCRProcessor.parse_page_range(args.pages),
+                    ocr_workers=args.ocr_workers,
+                    max_documents=args.max_documents,
+                )
+        else:
+            processor.process_pdf_files()
     except ValueError:
         print("An unexpected error occurred")
@@ -0,0 +1,154 @@
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from time import time
+from typing import Iterable, Iterator, Mapping
+
+DATABASE_PATH = Path("database") / "quizzes.sqlite3"
+
+
+def _as_row(question: Mapping | tuple) -> tuple[str, str]:
+    """Accepts {"question": ..., "answer": ...} mappings as stored in data.json, or (question, answer) pairs."""
+    if isinstance(question, Mapping):
+        return question["question"], question["answer"]
+    return question[0], question[1]
+
+
+class QuizStore:
+    """Named quizzes in SQLite, indexed so a quiz can be read or extended without loading the others.
+
+    Every write runs in a single transaction, so a quiz is never left half-written.
+    """
+
+    def __init__(self, path: Path = DATABASE_PATH) -> None:
+        """Opens (or creates) the quiz database."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS quizzes ("
+                "id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                "quiz_id INTEGER NOT NULL REFERENCES quizzes (id) ON DELETE CASCADE, position INTEGER NOT NULL, "
+                "question TEXT NOT NULL, answer TEXT NOT NULL, PRIMARY KEY (quiz_id, position))"
+            )
+            self._connection.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _quiz_id(self, name: str, create: bool = False) -> int | None:
+        """Returns the id of a quiz, creating the quiz first if asked to."""
+        row = self._connection.execute("SELECT id FROM quizzes WHERE name = ?", (name,)).fetchone()
+        if row is not None or not create:
+            return row[0] if row else None
+        now = time()
+        return self._connection.execute(
+            "INSERT INTO quizzes (name, created, updated) VALUES (?, ?, ?)", (name, now, now)
+        ).lastrowid
+
+    def add_questions(self, name: str, questions: Iterable[Mapping | tuple]) -> int:
+        """Appends questions to a quiz, creating it if needed, and returns how many were added."""
+        with self._lock, self._connection:
+            quiz_id = self._quiz_id(name, create=True)
+            next_position = self._connection.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM questions WHERE quiz_id = ?", (quiz_id,)
+            ).fetchone()[0]
+            rows = (
+                (quiz_id, position, *_as_row(question))
+                for position, question in enumerate(questions, next_position)
+            )
+            added = self._connection.executemany(
+                "INSERT INTO questions (quiz_id, position, question, answer) VALUES (?, ?, ?, ?)", rows
+            ).rowcount
+            self._connection.execute("UPDATE quizzes SET updated = ? WHERE id = ?", (time(), quiz_id))
+        return added
+
+    def replace_questions(self, name: str, questions: Iterable[Mapping | tuple]) -> int:
+        """Replaces a quiz's questions in one transaction; readers see either the old or the new quiz."""
+        with self._lock, self._connection:
+            quiz_id = self._quiz_id(name, create=True)
+            self._connection.execute("DELETE FROM questions WHERE quiz_id = ?", (quiz_id,))
+            rows = ((quiz_id, position, *_as_row(question)) for position, question in enumerate(questions))
+            added = self._connection.executemany(
+                "INSERT INTO questions (quiz_id, position, question, answer) VALUES (?, ?, ?, ?)", rows
+            ).rowcount
+            self._connection.execute("UPDATE quizzes SET updated = ? WHERE id = ?", (time(), quiz_id))
+        return added
+
+    def iter_questions(self, name: str, batch_size: int = 500) -> Iterator[dict]:
+        """Yields a quiz's questions in order, fetching them from the database in batches."""
+        with self._lock:
+            quiz_id = self._quiz_id(name)
+        if quiz_id is None:
+            raise KeyError(f"No quiz named '{name}'")
+
+        # Keyset pagination keeps every query on the primary key index and never holds a cursor open
+        position = -1
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT position, question, answer FROM questions WHERE quiz_id = ? AND position > ? "
+                    "ORDER BY position LIMIT ?",
+                    (quiz_id, position, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for position, question, answer in rows:
+                yield {"question": question, "answer": answer}
+
+    def count(self, name: str) -> int:
+        """Returns the number of questions in a quiz."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM questions JOIN quizzes ON quizzes.id = questions.quiz_id WHERE quizzes.name = ?",
+                (name,),
+            ).fetchone()[0]
+
+    def quiz_names(self) -> list[str]:
+        """Returns the names of every stored quiz."""
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT name FROM quizzes ORDER BY name")]
+
+    def delete_quiz(self, name: str) -> bool:
+        """Deletes a quiz and its questions; returns False if there was no such quiz."""
+        with self._lock, self._connection:
+            return self._connection.execute("DELETE FROM quizzes WHERE name = ?", (name,)).rowcount > 0
+
+    def get_setting(self, key: str) -> str | None:
+        """Returns a stored setting such as the API key."""
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_setting(self, key: str, value: str) -> None:
+        """Stores a setting."""
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+
+    def import_json(self, json_path: Path) -> int:
+        """Imports the quiz and API key from a legacy data.json, returning the number of questions imported."""
+        try:
+            with open(json_path, "r", encoding="utf-8") as database:
+                data = json.load(database)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return 0
+
+        if data.get("api_key"):
+            self.set_setting("api_key", data["api_key"])
+        quiz = data.get("quiz") or {}
+        if not quiz.get("quiz_name"):
+            return 0
+        imported = self.replace_questions(quiz["quiz_name"], quiz.get("questions", []))
+        logging.info(f"Imported quiz '{quiz['quiz_name']}' with {imported} questions from {json_path}")
+        return imported
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import time
+from typing import Iterable, Iterator
+
+CACHE_PATH = Path(__file__).resolve().parent / ".cache" / "software_inventory.sqlite3"
+DPKG_STATUS_PATH = Path("/var/lib/dpkg/status")
+UNINSTALL_KEY = r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall"
+DPKG_LOCK_TIMEOUT = 600  # Seconds apt-get waits for another package manager to release the dpkg lock
+
+
+class InventorySource(ABC):
+    """Lists the software installed on this host.
+
+    ``state`` must be cheap and change whenever the installed software may have changed, so a snapshot
+    taken in the same state can be reused without calling the much slower ``scan``.
+    """
+
+    name = "base"
+    location = ""  # What the source reads; sources of the same kind at different locations are cached apart
+    max_parallel_installs: int | None = None  # Set when the installer cannot run several times at once
+
+    @abstractmethod
+    def state(self) -> str:
+        """Returns a fingerprint of the source's modification state."""
+
+    @abstractmethod
+    def scan(self) -> Iterator[str]:
+        """Yields the name of every installed package."""
+
+    @abstractmethod
+    def install_command(self, software_name: str) -> list[str]:
+        """Returns the command that installs a package by name."""
+
+
+class WindowsRegistrySource(InventorySource):
+    """Reads display names from the Uninstall key of HKEY_LOCAL_MACHINE and installs with winget."""
+
+    name = "windows-registry"
+
+    def __init__(self, key_path: str = UNINSTALL_KEY) -> None:
+        """Remembers which registry key to read; the registry itself is opened on use."""
+        self.key_path = key_path
+        self.location = key_path
+
+    def _open(self):
+        import winreg
+
+        registry = winreg.ConnectRegistry(None, winreg.HKEY_LOCAL_MACHINE)
+        return winreg, winreg.OpenKey(registry, self.key_path)
+
+    def state(self) -> str:
+        # The key's last write time and subkey count change whenever a program is installed or removed
+        winreg, key = self._open()
+        subkeys, _, last_modified = winreg.QueryInfoKey(key)
+        return f"{subkeys}:{last_modified}"
+
+    def scan(self) -> Iterator[str]:
+        winreg, key = self._open()
+        for i in range(winreg.QueryInfoKey(key)[0]):
+            try:
+                software_key_name = winreg.EnumKey(key, i)
+                software_key = winreg.OpenKey(key, software_key_name)
+                try:
+                    yield winreg.QueryValueEx(software_key, "DisplayName")[0]
+                except FileNotFoundError:
+                    # Handle the case where "DisplayName" is not present
+                    pass
+                except Exception as e:
+                    # Log unexpected errors while accessing key values
+                    print(f"Error reading key {software_key_name}: {e}")
+            except FileNotFoundError:
+                # Handle the case where a key cannot be accessed
+                pass
+            except Exception as e:
+                # Log unexpected errors while iterating keys
+                print(f"Error accessing key {i}: {e}")
+
+    def install_command(self, software_name: str) -> list[str]:
+        return ["winget", "install", "--id", software_name, "--silent"]
+
+
+class DpkgStatusSource(InventorySource):
+    """Reads installed packages from a dpkg status database, or a copy of one used as a fixture."""
+
+    name = "dpkg"
+    # dpkg holds one lock for the whole system, so concurrent apt-get installs would only fail on it
+    max_parallel_installs = 1
+
+    def __init__(self, path: Path = DPKG_STATUS_PATH) -> None:
+        """Uses the system status database unless another file is given."""
+        self.path = Path(path)
+        self.location = os.fspath(self.path.resolve())
+
+    def state(self) -> str:
+        # dpkg rewrites the status file on every install or removal
+        stat = self.path.stat()
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def scan(self) -> Iterator[str]:
+        # Stanzas are separated by blank lines; only packages whose Status ends in "installed" count,
+        # which skips removed packages that left configuration files behind ("deinstall ok config-files")
+        package = status = None
+        with open(self.path, "r", encoding="utf-8", errors="replace") as file:
+            for line in file:
+                if line.startswith("Package:"):
+                    package = line[len("Package:"):].strip()
+                elif line.startswith("Status:"):
+                    status = line[len("Status:"):].split()
+                elif not line.strip():
+                    if package and status and status[-1] == "installed":
+                        yield package
+                    package = status = None
+        if package and status and status[-1] == "installed":
+            yield package
+
+    def install_command(self, software_name: str) -> list[str]:
+        return ["apt-get", "-o", f"DPkg::Lock::Timeout={DPKG_LOCK_TIMEOUT}", "install", "-y", software_name]
+
+
+def default_source() -> InventorySource:
+    """Returns the inventory source for the current platform."""
+    if sys.platform == "win32":
+        return WindowsRegistrySource()
+    if DPKG_STATUS_PATH.exists():
+        return DpkgStatusSource()
+    raise RuntimeError(f"No software inventory source for platform '{sys.platform}'")
+
+
+class SnapshotCache:
+    """Persistent snapshots of each source's package list, valid for as long as the source's state is unchanged."""
+
+    def __init__(self, path: Path = CACHE_PATH) -> None:
+        """Opens (or creates) the SQLite snapshot database."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "source TEXT PRIMARY KEY, state TEXT NOT NULL, taken REAL NOT NULL, names TEXT NOT NULL)"
+            )
+
+    def get(self, source: str, state: str) -> list[str] | None:
+        """Returns the snapshot taken in this state, or None if the source has changed since."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT names FROM snapshots WHERE source = ? AND state = ?", (source, state)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, source: str, state: str, names: list[str]) -> None:
+        """Stores a snapshot, replacing the source's previous one."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO snapshots (source, state, taken, names) VALUES (?, ?, ?, ?)",
+                (source, state, time(), json.dumps(names)),
+            )
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+def installed_software(source: InventorySource, cache: SnapshotCache | None = None) -> list[str]:
+    """Returns the sorted, distinct installed package names, rescanning only if the source has changed."""
+    if cache is None:
+        return sorted(set(source.scan()))
+
+    key, state = f"{source.name}:{source.location}", source.state()
+    names = cache.get(key, state)
+    if names is not None:
+        logging.info(f"{source.name}: unchanged since the last scan, using the cached snapshot")
+        return names
+    names = sorted(set(source.scan()))
+    cache.put(key, state, names)
+    return names
+
+
+@dataclass
+class InventoryDiff:
+    """Packages installed since a baseline was saved, and packages from the baseline no longer installed."""
+
+    added: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+def diff(baseline: Iterable[str], current: Iterable[str]) -> InventoryDiff:
+    """Compares a baseline package list with the current one."""
+    baseline_set, current_set = set(baseline), set(current)
+    return InventoryDiff(added=sorted(current_set - baseline_set), removed=sorted(baseline_set - current_set))
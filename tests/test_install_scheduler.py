@@ -0,0 +1,84 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from install_scheduler import InstallScheduler, command_template  # noqa: E402
+
+# Logs when each install starts and ends; "slow" packages hang, "fail" packages exit with an error
+FAKE_INSTALLER = """
+import sys, time
+name, log = sys.argv[1], sys.argv[2]
+with open(log, "a") as file:
+    file.write(f"start {name} {time.time()}\\n")
+time.sleep(60 if name.startswith("slow") else 0.3)
+with open(log, "a") as file:
+    file.write(f"end {name} {time.time()}\\n")
+sys.exit(1 if name.startswith("fail") else 0)
+"""
+
+
+class InstallSchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        script = Path(self.directory.name) / "installer.py"
+        script.write_text(FAKE_INSTALLER, encoding="utf-8")
+        self.log = Path(self.directory.name) / "installs.log"
+        self.command_for = command_template(f'"{sys.executable}" "{script}" {{name}} "{self.log}"')
+
+    def events(self) -> dict[tuple[str, str], float]:
+        """Returns {(event, package): time} from the installer log."""
+        if not self.log.exists():
+            return {}
+        lines = self.log.read_text(encoding="utf-8").split()
+        return {(event, name): float(at) for event, name, at in zip(lines[::3], lines[1::3], lines[2::3])}
+
+    def test_template_needs_a_name_placeholder(self) -> None:
+        with self.assertRaises(ValueError):
+            command_template("apt-get install -y")
+
+    def test_no_more_than_max_parallel_installs_run_at_once(self) -> None:
+        packages = [f"package{index}" for index in range(6)]
+        results = InstallScheduler(self.command_for, max_parallel=2).run(packages)
+
+        self.assertEqual([result.name for result in results], packages)
+        self.assertTrue(all(result.ok for result in results))
+        events = self.events()
+        starts = sorted(events["start", name] for name in packages)
+        running = max(
+            sum(events["start", name] <= start < events["end", name] for name in packages) for start in starts
+        )
+        self.assertEqual(running, 2)
+
+    def test_a_package_starts_only_after_the_packages_it_follows(self) -> None:
+        scheduler = InstallScheduler(self.command_for, max_parallel=4, after={"app": ["runtime"], "ignored": ["x"]})
+        results = scheduler.run(["app", "runtime", "ignored"])
+
+        self.assertTrue(all(result.ok for result in results))
+        events = self.events()
+        self.assertGreaterEqual(events["start", "app"], events["end", "runtime"])
+
+    def test_a_package_is_skipped_when_a_prerequisite_fails(self) -> None:
+        scheduler = InstallScheduler(self.command_for, after={"app": ["fail-runtime"]})
+        results = {result.name: result for result in scheduler.run(["app", "fail-runtime"])}
+
+        self.assertEqual(results["fail-runtime"].status, "failed")
+        self.assertEqual(results["fail-runtime"].returncode, 1)
+        self.assertEqual(results["app"].status, "skipped")
+        self.assertNotIn(("start", "app"), self.events())
+
+    def test_a_hung_install_is_killed_after_the_timeout(self) -> None:
+        scheduler = InstallScheduler(self.command_for, timeout=1)
+        results = {result.name: result for result in scheduler.run(["slow", "fast"])}
+
+        self.assertEqual(results["slow"].status, "timeout")
+        self.assertLess(results["slow"].duration, 10)
+        self.assertTrue(results["fast"].ok)
+        self.assertNotIn(("end", "slow"), self.events())
+
+
+if __name__ == "__main__":
+    unittest.main()
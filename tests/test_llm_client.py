@@ -0,0 +1,127 @@
+import json
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm_client import LLMClient, LLMError, OpenAIClient, stream_to_file  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers each request with the next scripted status, then with a chat completion once the script is used up."""
+
+    protocol_version = "HTTP/1.1"
+    statuses: list[int] = []
+    requests: list[dict] = []
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        StubHandler.requests.append(body)
+        status = StubHandler.statuses.pop(0) if StubHandler.statuses else 200
+        if status != 200:
+            self.send_response(status)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if body.get("stream"):
+            lines = [
+                {"choices": [{"delta": {"content": "hi "}}]},
+                {"choices": [{"delta": {"content": "there"}}]},
+                {"choices": [], "usage": {"prompt_tokens": 3, "completion_tokens": 2}},
+            ]
+            data = "".join(f"data: {json.dumps(line)}\n\n" for line in lines) + "data: [DONE]\n\n"
+        else:
+            data = json.dumps({
+                "choices": [{"message": {"content": "hi there"}}],
+                "usage": {"prompt_tokens": 3, "completion_tokens": 2},
+            })
+        payload = data.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class LLMClientRetryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        StubHandler.statuses, StubHandler.requests = [], []
+        self.client = OpenAIClient(
+            api_key="test", base_url=f"http://127.0.0.1:{self.server.server_port}", max_retries=3, backoff_base=0.01
+        )
+
+    def chat(self):
+        return self.client.run(self.client.chat("test-model", MESSAGES))
+
+    def test_base_class_is_abstract(self) -> None:
+        with self.assertRaises(TypeError):
+            LLMClient("http://127.0.0.1")
+
+    def test_rate_limited_and_server_errors_are_retried(self) -> None:
+        StubHandler.statuses = [429, 503, 500]
+        result = self.chat()
+        self.assertEqual(result.content, "hi there")
+        self.assertEqual(result.total_tokens, 5)
+        self.assertEqual(len(StubHandler.requests), 4)
+
+    def test_retries_give_up_after_max_retries(self) -> None:
+        StubHandler.statuses = [502] * 4
+        with self.assertRaises(LLMError):
+            self.chat()
+        self.assertEqual(len(StubHandler.requests), 4)
+
+    def test_client_errors_are_not_retried(self) -> None:
+        StubHandler.statuses = [400]
+        with self.assertRaises(LLMError):
+            self.chat()
+        self.assertEqual(len(StubHandler.requests), 1)
+
+    def test_stream_is_retried_before_the_first_byte(self) -> None:
+        StubHandler.statuses = [429]
+
+        async def collect() -> str:
+            return "".join([delta async for delta in self.client.stream_chat("test-model", MESSAGES)])
+
+        self.assertEqual(self.client.run(collect()), "hi there")
+        self.assertEqual(len(StubHandler.requests), 2)
+
+    def test_stream_to_file_keeps_the_old_file_when_nothing_arrives(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "summary.md"
+            path.write_text("previous summary", encoding="utf-8")
+            StubHandler.statuses = [400]
+            with self.assertRaises(LLMError):
+                self.client.run(stream_to_file(self.client, path, "test-model", MESSAGES))
+            self.assertEqual(path.read_text(encoding="utf-8"), "previous summary")
+
+            self.client.run(stream_to_file(self.client, path, "test-model", MESSAGES))
+            self.assertEqual(path.read_text(encoding="utf-8"), "hi there")
+
+    def test_backoff_honours_retry_after_and_caps_the_delay(self) -> None:
+        self.assertEqual(self.client.backoff_delay(0, "2"), 2.0)
+        self.assertEqual(self.client.backoff_delay(0, "3600"), self.client.backoff_max)
+        self.assertLessEqual(self.client.backoff_delay(20), self.client.backoff_max)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import socket
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ollama_server import OllamaServer  # noqa: E402
+
+COLD_LOAD_SECONDS = 0.3
+
+
+class StubOllama(BaseHTTPRequestHandler):
+    """Answers the Ollama endpoints OllamaServer uses; the first generate for a model pays a load delay."""
+
+    protocol_version = "HTTP/1.1"
+    loaded: set[str] = set()
+    generate_requests: list[dict] = []
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def reply(self, data: dict) -> None:
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        if self.path == "/api/version":
+            self.reply({"version": "0.0.0"})
+        elif self.path == "/api/ps":
+            self.reply({"models": [{"name": name} for name in sorted(StubOllama.loaded)]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        StubOllama.generate_requests.append(body)
+        name = f"{body['model']}:latest"
+        if name not in StubOllama.loaded:
+            time.sleep(COLD_LOAD_SECONDS)
+            StubOllama.loaded.add(name)
+        self.reply({"response": "", "done": True})
+
+
+def free_port() -> int:
+    """Returns a port nothing is listening on."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class OllamaServerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        StubOllama.loaded, StubOllama.generate_requests = set(), []
+        self.stub = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+        self.addCleanup(self.stub.server_close)
+        self.server = OllamaServer(port=self.stub.server_port, executable="missing-ollama-binary")
+
+    def serve(self, delay: float = 0.0) -> None:
+        """Starts answering requests after the delay; the port already accepts connections before that."""
+        def run() -> None:
+            time.sleep(delay)
+            self.stub.serve_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        self.addCleanup(self.stub.shutdown)
+
+    def test_wait_until_ready_returns_once_the_server_answers(self) -> None:
+        self.serve(delay=0.8)
+        started = time.monotonic()
+        self.assertTrue(self.server.wait_until_ready(timeout=10))
+        self.assertGreaterEqual(time.monotonic() - started, 0.8)
+
+    def test_wait_until_ready_gives_up_after_the_timeout(self) -> None:
+        server = OllamaServer(port=free_port())
+        started = time.monotonic()
+        self.assertFalse(server.wait_until_ready(timeout=0.5))
+        self.assertLess(time.monotonic() - started, 3)
+
+    def test_start_reuses_a_running_server(self) -> None:
+        self.serve()
+        self.assertTrue(self.server.start(timeout=1))
+        self.assertIsNone(self.server.process)
+
+    def test_warm_up_records_cold_and_warm_latency(self) -> None:
+        self.serve()
+        self.server.warm_up()
+
+        self.assertGreaterEqual(self.server.cold_latency, COLD_LOAD_SECONDS)
+        self.assertLess(self.server.warm_latency, COLD_LOAD_SECONDS)
+        self.assertEqual(len(StubOllama.generate_requests), 2)
+        for request in StubOllama.generate_requests:
+            self.assertEqual(request["keep_alive"], self.server.keep_alive)
+            self.assertEqual(request["options"], {"num_ctx": self.server.num_ctx})
+
+    def test_warm_up_of_a_loaded_model_only_records_warm_latency(self) -> None:
+        StubOllama.loaded.add("llama3:latest")
+        self.serve()
+        self.server.warm_up_in_background()
+        self.server.wait_for_warm_up()
+
+        self.assertIsNone(self.server.cold_latency)
+        self.assertLess(self.server.warm_latency, COLD_LOAD_SECONDS)
+        self.assertEqual(len(StubOllama.generate_requests), 1)
+
+    def test_warm_up_failure_is_logged_not_raised(self) -> None:
+        server = OllamaServer(port=free_port())
+        with self.assertLogs(level="ERROR"):
+            server.warm_up(timeout=1)
+        self.assertIsNone(server.cold_latency)
+        self.assertIsNone(server.warm_latency)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+if TYPE_CHECKING:
+    import tiktoken
+
+# Markdown headings, numbered slide titles and other short lines that start a new section
+HEADING_PATTERN = re.compile(r"^\s*(#{1,6}\s|\d+(\.\d+)*\s+[A-Z]|[A-Z][A-Z0-9 \-:]{3,}$)")
+# Sentence ends: the position right after terminal punctuation and one whitespace character
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?]\s)")
+
+# Boundary strengths, a chunk prefers to end on the strongest boundary available
+PAGE, HEADING, PARAGRAPH, SENTENCE, LINE = 4, 3, 2, 1, 0
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = "cl100k_base") -> "tiktoken.Encoding":
+    """Returns a tiktoken encoder, building each one only once per process."""
+    # tiktoken is imported on first use so that scripts start without paying for it
+    import tiktoken
+
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text: str, encoding: str = "cl100k_base") -> int:
+    """Returns the number of tokens the text encodes to."""
+    return len(get_encoding(encoding).encode(text, disallowed_special=()))
+
+
+def split_units(text: str, page_break: bool = True) -> Iterator[tuple[str, int]]:
+    """Splits a text into sentence-sized units, each tagged with the strength of the boundary before it."""
+    boundary = PAGE if page_break else PARAGRAPH
+    for line in text.splitlines(keepends=True):
+        if not line.strip():
+            # Blank lines mark paragraph ends; keep them attached to the previous unit
+            boundary = max(boundary, PARAGRAPH)
+            yield line, LINE
+            continue
+        if HEADING_PATTERN.match(line):
+            boundary = max(boundary, HEADING)
+
+        for sentence in SENTENCE_PATTERN.split(line):
+            if sentence:
+                yield sentence, boundary
+                boundary = SENTENCE
+        boundary = LINE
+
+
+class TokenChunker:
+    """Groups text into token-budgeted chunks in a single linear pass.
+
+    Every unit (a sentence or line) is encoded exactly once. When the budget is reached the chunk is
+    cut at the strongest boundary seen in its second half (page, heading, paragraph, sentence), and the
+    last ``overlap`` tokens of each chunk are repeated at the start of the next one.
+    """
+
+    def __init__(self, max_tokens: int, overlap: int = 0, encoding: str = "cl100k_base") -> None:
+        """Initializes the chunker with a token budget and the number of overlapping tokens."""
+        if overlap >= max_tokens:
+            raise ValueError("overlap must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.enc = get_encoding(encoding)
+
+    def chunks(self, texts: Iterable[str], page_breaks: bool = True) -> Iterator[str]:
+        """Yields chunks from a stream of texts (e.g. pages), each as soon as it is full.
+
+        Each text starts on a page boundary unless ``page_breaks`` is False, e.g. for the paragraphs of
+        one continuous document.
+        """
+        units: list[tuple[str, int, int]] = []  # (text, token count, boundary before it)
+        total = 0
+
+        for text in texts:
+            for unit, boundary in split_units(text, page_breaks):
+                tokens = self.enc.encode(unit, disallowed_special=())
+                if len(tokens) > self.max_tokens:
+                    # A single unit larger than the budget is flushed on its own, cut on token boundaries
+                    if self._has_content(units):
+                        yield "".join(unit for unit, _, _ in units)
+                    for start in range(0, len(tokens), self.max_tokens - self.overlap):
+                        yield self.enc.decode(tokens[start:start + self.max_tokens])
+                    units, total = [], 0
+                    continue
+
+                units.append((unit, len(tokens), boundary))
+                total += len(tokens)
+                while total > self.max_tokens:
+                    cut = self._best_cut(units)
+                    if not self._has_content(units[:cut]):
+                        # The overlap leaves no room for the next unit, so drop it
+                        units = [entry for entry in units if entry[2] != -1]
+                    else:
+                        yield "".join(unit for unit, _, _ in units[:cut])
+                        units = self._carry(units[:cut]) + units[cut:]
+                    total = sum(count for _, count, _ in units)
+
+        if self._has_content(units):
+            yield "".join(unit for unit, _, _ in units)
+
+    def _best_cut(self, units: list[tuple[str, int, int]]) -> int:
+        """Returns the index to cut before: the strongest boundary in the back half of the budget."""
+        running, best, best_strength = 0, None, -1
+        for index, (_, count, boundary) in enumerate(units):
+            if running + count > self.max_tokens:
+                break
+            if index and boundary >= 0 and running >= self.max_tokens // 2 and boundary >= best_strength:
+                best, best_strength = index, boundary
+            running += count
+        return best if best is not None else max(index, 1)
+
+    @staticmethod
+    def _has_content(units: list[tuple[str, int, int]]) -> bool:
+        """Returns True if the units contain anything besides overlap carried from the previous chunk."""
+        return any(boundary != -1 for _, _, boundary in units)
+
+    def _carry(self, emitted: list[tuple[str, int, int]]) -> list[tuple[str, int, int]]:
+        """Returns the trailing units of an emitted chunk that fit in the overlap budget."""
+        carried, total = [], 0
+        for unit, count, _ in reversed(emitted):
+            if total + count > self.overlap:
+                break
+            # Overlap units are marked -1 so they never start or end a chunk on their own
+            carried.append((unit, count, -1))
+            total += count
+        carried.reverse()
+        return carried
+
+
+def chunk_stream(
+    texts: Iterable[str], max_tokens: int, overlap: int = 0, encoding: str = "cl100k_base", page_breaks: bool = True
+) -> Iterator[str]:
+    """Groups a stream of texts into chunks of at most max_tokens tokens, yielding each as soon as it is full."""
+    return TokenChunker(max_tokens, overlap, encoding).chunks(texts, page_breaks)
+
+
+def chunk_text(text: str, max_tokens: int, overlap: int = 0, encoding: str = "cl100k_base") -> list[str]:
+    """Splits a text into chunks of at most max_tokens tokens."""
+    return list(chunk_stream([text], max_tokens, overlap, encoding))
+
+
+def merge_groups(texts: list[str], max_tokens: int, encoding: str = "cl100k_base") -> list[list[str]]:
+    """Groups consecutive texts into runs of at most max_tokens tokens, to be merged one request per run.
+
+    Texts are never cut; one that does not fit beside its neighbours gets a run of its own.
+    """
+    groups, group, group_tokens = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text, encoding)
+        if group and group_tokens + tokens > max_tokens:
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(text)
+        group_tokens += tokens
+    if group:
+        groups.append(group)
+    return groups
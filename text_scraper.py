@@ -1,11 +1,16 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-import pyperclip
-from pdf2image import convert_from_path, exceptions
-from pytesseract import image_to_string, pytesseract
+import ocr_cache
+import ocr_engine
 
-pytesseract.tesseract_cmd = r"C:\Users\michael\AppData\Local\Programs\Tesseract-OCR"
+TESSERACT_CMD = r"C:\Users\michael\AppData\Local\Programs\Tesseract-OCR"
+
+
+def configure_tesseract():
+    # pytesseract is slow to import (it loads pandas when installed), so it is only set up once there is work
+    from pytesseract import pytesseract
+    pytesseract.tesseract_cmd = TESSERACT_CMD
 
 
 def clear_summary_file():
@@ -14,7 +19,13 @@ def clear_summary_file():
 
 
 def ocr_image(image):
-    return image_to_string(image)
+    from image_preprocess import preprocess
+
+    # Blank pages are skipped, the rest are binarized and cropped before OCR
+    processed = preprocess(image, dpi=300)
+    if processed is None:
+        return ""
+    return ocr_engine.ocr_image(processed)
 
 
 def process_images(pdf_file):
@@ -29,7 +40,14 @@ def process_images(pdf_file):
         except Exception as e:
             print(f"Invalid range entered ({e}). Processing entire PDF.")
     # Open the PDF file
-    images = convert_from_path(pdf_file, dpi=300, first_page=start_page, last_page=end_page)
+    from pdf2image import convert_from_path
+    from pdf2image.exceptions import PDFPageCountError
+    configure_tesseract()
+    try:
+        images = convert_from_path(pdf_file, dpi=300, first_page=start_page, last_page=end_page)
+    except PDFPageCountError:
+        print("Please re-enter pdf name")
+        return
     total_pages = len(images)
     print(f"PDF has {total_pages} pages.")
 
@@ -45,6 +63,7 @@ def process_images(pdf_file):
             except Exception as e:
                 print(f"Error processing an image - {e}")
 
+    ocr_cache.get_cache().log_stats()
     extracted_text = "".join(extracted_text_list)
     print(extracted_text)
 
@@ -62,6 +81,7 @@ def process_images(pdf_file):
         "and diagrams where necessary. Ensure the notes cover all the material presented in the lecture "
         f"and are clear and easy to understand. Respond only in markdown format.\ntext:\n\n{extracted_text}"
     )
+    import pyperclip
     pyperclip.copy(chatgpt_input)
 
 
@@ -77,8 +97,6 @@ def main():
         raise SystemExit(0)
     except FileNotFoundError as error:
         print(f"File not found: {error}")
-    except exceptions.PDFPageCountError:
-        print("Please re-enter pdf name")
 
 
 if __name__ == "__main__":
@@ -1,40 +1,22 @@
+import argparse
 import csv
-import winreg
-import subprocess
+import json
+from pathlib import Path
 
+from install_scheduler import INSTALL_TIMEOUT, MAX_PARALLEL_INSTALLS, InstallScheduler, command_template, write_summary
+from software_inventory import DpkgStatusSource, SnapshotCache, default_source, diff, installed_software
 
-def list_installed_software():
-    install_software_list = []
-    try:
-        reg = winreg.ConnectRegistry(None, winreg.HKEY_LOCAL_MACHINE)
-        key = winreg.OpenKey(reg, r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall")
-
-        install_software_list = []
-        for i in range(winreg.QueryInfoKey(key)[0]):
-            try:
-                software_key_name = winreg.EnumKey(key, i)
-                software_key = winreg.OpenKey(key, software_key_name)
-                try:
-                    software_name = winreg.QueryValueEx(software_key, "DisplayName")[0]
-                    install_software_list.append(software_name)
-                except FileNotFoundError:
-                    # Handle the case where "DisplayName" is not present
-                    pass
-                except Exception as e:
-                    # Log unexpected errors while accessing key values
-                    print(f"Error reading key {software_key_name}: {e}")
-            except FileNotFoundError:
-                # Handle the case where a key cannot be accessed
-                pass
-            except Exception as e:
-                # Log unexpected errors while iterating keys
-                print(f"Error accessing key {i}: {e}")
 
+def list_installed_software(source=None, use_cache=True):
+    # Reuses the last snapshot when the source reports no change since it was taken
+    try:
+        source = source or default_source()
+        cache = SnapshotCache() if use_cache else None
+        return installed_software(source, cache)
     except Exception as e:
-        # Log unexpected errors while accessing the registry
-        print(f"Error accessing registry: {e}")
-
-    return sorted(set(install_software_list))
+        # Log unexpected errors while reading the inventory
+        print(f"Error accessing software inventory: {e}")
+        return []
 
 
 def save_to_csv(save_software_list, filename="database/installed_software.csv"):
@@ -62,44 +44,68 @@ def read_software_from_csv(m_filename="database/installed_software.csv"):
     return m_software_list
 
 
-def install_software(software_name):
-    try:
-        print(f"Installing {software_name} using winget...")
-        # Use winget to install the software
-        command = ["winget", "install", "--id", software_name, "--silent"]
-        result = subprocess.run(command, capture_output=True, text=True)
-        if result.returncode == 0:
-            print(f"{software_name} installed successfully.")
-        else:
-            print(f"Failed to install {software_name}. Error: {result.stderr}")
-            
-    except Exception as e:
-        print(f"Error installing {software_name}: {e}")
-
-
-def check_and_install_missing_software():
-    # Read list of installed software
-    installed_software = list_installed_software()
-    # Read list of software from CSV
-    csv_software_list = read_software_from_csv()
-
-    # Create sets for comparison
-    installed_set = set(installed_software)
-    csv_set = set(csv_software_list)
+def check_and_install_missing_software(source=None, installed_software_list=None,
+                                       filename="database/installed_software.csv", scheduler=None):
+    # Returns the install results, one per baseline package that was missing
+    # Read list of installed software unless the caller already has it
+    if installed_software_list is None:
+        installed_software_list = list_installed_software(source)
+    # Compare against the software saved in the CSV baseline
+    changes = diff(read_software_from_csv(filename), installed_software_list)
 
-    # Determine missing software
-    missing_software = csv_set - installed_set
+    if changes.added:
+        print("Installed since the baseline was saved:")
+        for software in changes.added:
+            print(f" + {software}")
 
-    if missing_software:
+    if changes.removed:
         print("Missing software to install:")
-        for software in missing_software:
+        for software in changes.removed:
             print(f" - {software}")
-            install_software(software)
-    else:
-        print("All software from CSV is already installed.")
+        # Install concurrently, following any ordering constraints the scheduler was given
+        if scheduler is None:
+            source = source or default_source()
+            scheduler = InstallScheduler(
+                source.install_command, max_parallel=source.max_parallel_installs or MAX_PARALLEL_INSTALLS
+            )
+        results = scheduler.run(changes.removed)
+        write_summary(results)
+        return results
+    print("All software from CSV is already installed.")
+    return []
 
 
 if __name__ == "__main__":
-    software_list = list_installed_software()
-    save_to_csv(software_list)
-    check_and_install_missing_software()
+    parser = argparse.ArgumentParser(description="Track installed software and reinstall what is missing.")
+    parser.add_argument("--dpkg-status", type=Path, help="Read packages from this dpkg status file")
+    parser.add_argument("--csv", default="database/installed_software.csv", help="Baseline software list")
+    parser.add_argument("--rescan", action="store_true", help="Ignore the cached snapshot")
+    parser.add_argument(
+        "--parallel", type=int, help=f"Installs run at once (default: 1 for apt-get, {MAX_PARALLEL_INSTALLS} otherwise)"
+    )
+    parser.add_argument("--timeout", type=float, default=INSTALL_TIMEOUT, help="Seconds allowed per install")
+    parser.add_argument("--installer", help='Install command with a {name} placeholder, e.g. "winget install {name}"')
+    parser.add_argument("--order", type=Path, help="JSON file mapping a package to the packages it must follow")
+    args = parser.parse_args()
+
+    inventory_source = DpkgStatusSource(args.dpkg_status) if args.dpkg_status else None
+    software_list = list_installed_software(inventory_source, use_cache=not args.rescan)
+    if not software_list:
+        # A failed scan must not mark the whole baseline as missing or overwrite it
+        raise SystemExit("No installed software found; the baseline was left unchanged.")
+    # Diff against the previous baseline before it is replaced with the current list
+    if Path(args.csv).exists():
+        source = inventory_source or default_source()
+        # A custom installer is assumed to cope with concurrent runs; the source's own installer may not
+        default_parallel = MAX_PARALLEL_INSTALLS if args.installer else source.max_parallel_installs
+        install_scheduler = InstallScheduler(
+            command_template(args.installer) if args.installer else source.install_command,
+            max_parallel=args.parallel or default_parallel or MAX_PARALLEL_INSTALLS,
+            timeout=args.timeout,
+            after=json.loads(args.order.read_text(encoding="utf-8")) if args.order else None,
+        )
+        install_results = check_and_install_missing_software(source, software_list, args.csv, install_scheduler)
+        # The scan predates the installs: packages just installed belong in the baseline, and ones that failed,
+        # timed out or were skipped stay in it so the next run tries them again
+        software_list = sorted(set(software_list) | {result.name for result in install_results})
+    save_to_csv(software_list, args.csv)